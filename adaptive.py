@@ -0,0 +1,123 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Adaptive grid of p0 values.
+
+ Rather than the fixed grid of runSim, the sweep starts from a coarse grid
+ (points values from lo to hi, plus pThreshold) and is run again, round
+ after round, on the midpoints of the intervals [a, b] of the grid where
+ the curves of some cell (nE, nN) need more points:
+    - the final number of E or I players changes by more than tol times
+      the largest value of the curve (steep part of the curve)
+    - the E and I curves cross
+    - pThreshold lies in [a, b): deltaE and deltaN are swapped for p0 >
+      pThreshold, and the curves jump
+ Intervals narrower than 2*minStep are not split. The sweep stops when no
+ interval needs more points, or after maxPoints values of p0. With
+ replicated cells the means are used; tol should be larger than their
+ noise, or the flat parts are refined too.
+
+ Usage:
+ > df = sim.runSim(..., adaptive=0.05)
+ > df = sim.runSim(..., adaptive=AdaptiveGrid(0.1, 0.6, 0.2, tol=0.02))
+
+"""
+
+import numpy as np
+
+
+class AdaptiveGrid:
+    """
+    Values of p0 of an adaptive sweep: iterating over the grid gives the
+    values of each round, and add() must be given the results of a round
+    before the next one. Each iteration starts again from the coarse grid,
+    so that the grid can be given to several sweeps.
+    """
+
+    def __init__(self, lo, hi, pThreshold=None, points=5, tol=0.05,
+    minStep=0.002, maxPoints=100):
+        self.tol = tol
+        self.minStep = minStep
+        self.maxPoints = maxPoints
+        self.pThreshold = pThreshold
+        grid = set(np.linspace(lo, hi, points))
+        if pThreshold is not None and lo < pThreshold < hi:
+            grid.add(pThreshold)
+        self.grid = sorted(grid) #  values of p0 of the first round
+        self.pending = []
+        self.p0 = [] #  values of p0 done
+        self.curves = {} #  (nE, nN) -> {p0: (nE players, nI players)}
+
+    def __iter__(self):
+        self.pending = list(self.grid)
+        self.p0 = []
+        self.curves = {}
+        while len(self.pending) > 0:
+            vals, self.pending = self.pending, []
+            self.p0 = sorted(self.p0 + vals)
+            yield vals
+            self.pending = self.refine()
+
+    def add(self, table):
+        """
+        Add the final counts of a round (see sim.getCountTable).
+        """
+
+        for nrE, nrI, p0, nE, nI in zip(table["nrE"], table["nrI"],
+        table["p0"], table["nE"], table["nI"]):
+            self.curves.setdefault((nrE, nrI), {})[p0] = (nE, nI)
+
+    def getScores(self, curve):
+        """
+        Return, for each interval of the grid, how much it needs more points
+        in the curve of a cell (> 1 if it does).
+        """
+
+        p0 = [p for p in self.p0 if p in curve]
+        counts = np.array([curve[p] for p in p0], dtype=float)
+        scale = np.maximum(np.nanmax(np.abs(counts), axis=0), 1.0)
+        steps = np.abs(np.diff(counts, axis=0))/scale
+        scores = np.nanmax(steps, axis=1)/self.tol
+
+        gap = counts[:, 0] - counts[:, 1]
+        cross = gap[:-1]*gap[1:] < 0
+        scores[cross] = np.maximum(scores[cross], 2.0)
+        return dict(zip(zip(p0[:-1], p0[1:]), scores))
+
+    def refine(self):
+        """
+        Return the values of p0 of the next round.
+        """
+
+        scores = {}
+        for curve in self.curves.values():
+            for interval, score in self.getScores(curve).items():
+                scores[interval] = max(score, scores.get(interval, 0.0))
+        if self.pThreshold is not None:
+            for a, b in zip(self.p0[:-1], self.p0[1:]):
+                if a <= self.pThreshold < b:
+                    scores[a, b] = max(scores.get((a, b), 0.0), 2.0)
+
+        split = [(score, (a+b)/2.0) for (a, b), score in scores.items() if
+        score > 1.0 and b - a >= 2.0*self.minStep]
+        split.sort(reverse=True)
+        room = max(self.maxPoints - len(self.p0), 0)
+        return sorted(p0 for score, p0 in split[:room])
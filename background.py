@@ -0,0 +1,159 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Sweeps run in the background.
+
+ sim.runSimAsync and sim.runSimTimeAsync start runSim and runSimTime in a
+ thread and return a SimRun at once, so that the Jupyter kernel stays free
+ (to draw, or to cancel the run). The rows of the DataFrame of each cell are
+ streamed as the cell is done:
+    - poll() returns the rows done since the last call, frame() all of them
+    - cells() blocks and yields them cell by cell, until the end of the run
+    - watch(callback) is a coroutine that calls callback(df) in the event
+      loop of the kernel each time new cells are done
+ cancel() stops the sweep before its next cell (the cells already started
+ by worker processes are finished first); result() then returns the
+ DataFrame of the cells done. With workers > 1 the cells are simulated by
+ worker processes, and the kernel is not slowed down by the run.
+
+ Usage:
+ > run = sim.runSimAsync(nESet, nNSet, ..., pNewI, workers=4)
+ > asyncio.ensure_future(run.watch(redraw))
+ > run.cancel()
+
+"""
+
+import asyncio
+import queue
+import threading
+
+from table import getFrame
+
+
+class SimRun:
+    """
+    Handle of func(*args, **kwargs) (runSim or runSimTime) running in a
+    background thread. rows holds the rows of the cells received so far.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.rows = []
+        self.value = None
+        self.error = None
+        self.finished = False #  end of the stream received
+        self.queue = queue.Queue()
+        self.event = threading.Event()
+        kwargs = dict(kwargs, onCell=self.queue.put, cancel=self.event)
+        self.thread = threading.Thread(target=self.run, args=(func, args,
+        kwargs), daemon=True)
+        self.thread.start()
+
+    def run(self, func, args, kwargs):
+        try:
+            self.value = func(*args, **kwargs)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.queue.put(None) #  end of the stream
+
+    def cancel(self):
+        """
+        Ask the run to stop before its next cell.
+        """
+        self.event.set()
+
+    def cancelled(self):
+        return self.event.is_set()
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def receive(self, rows):
+        """
+        Keep the rows of a cell taken from the queue (None ends the stream).
+        """
+
+        if rows is None:
+            self.finished = True
+            return []
+        self.rows.extend(rows)
+        return rows
+
+    def poll(self):
+        """
+        Return the rows of the cells done since the last call, without
+        waiting.
+        """
+
+        new = []
+        while not self.finished:
+            try:
+                new.extend(self.receive(self.queue.get_nowait()))
+            except queue.Empty:
+                break
+        return new
+
+    def frame(self):
+        """
+        Return the DataFrame of all the cells done so far.
+        """
+
+        self.poll()
+        return getFrame(self.rows)
+
+    def cells(self):
+        """
+        Yield the rows of each cell as soon as it is done, until the end of
+        the run.
+        """
+
+        while not self.finished:
+            rows = self.receive(self.queue.get())
+            if rows:
+                yield rows
+
+    def result(self, timeout=None):
+        """
+        Wait for the end of the run and return what func returned (raise
+        its error, if any, or TimeoutError after timeout seconds).
+        """
+
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            raise TimeoutError("The run is not over")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    async def watch(self, callback, interval=0.25):
+        """
+        Call callback(df), df holding all the cells done so far, each time
+        new cells are done, checking every interval seconds without blocking
+        the event loop. Return the result of the run.
+        """
+
+        while True:
+            over = self.done()
+            if self.poll():
+                callback(getFrame(self.rows))
+            if over:
+                return self.result()
+            await asyncio.sleep(interval)
@@ -0,0 +1,396 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Headless batch runner: run the sweeps described by manifests, with no
+ plots and no prompts, and print a JSON summary.
+
+ A manifest (JSON, or TOML with Python >= 3.11 or tomli) holds the fields of
+ one sweep (see DEFAULTS), or a list "sweeps" of them, the other fields of
+ the manifest being the defaults of its sweeps:
+    - "func"              : "runSim" (p0 grid) or "runSimTime" (p0L, p0H)
+    - "nE", "nN"          : lists of players (or "ratio", nN = ratio*nE);
+      with ratio and several nE, one sweep is run for each nE, so that the
+      cells (nE, nN) are those of the ratios only (put {nE} in "output")
+    - "alpha", "nPeriods", "deltaE", "deltaN", "pThreshold", "pNewE",
+      "pNewI", "p0L", "p0H" : parameters; a list of values makes a grid,
+      one sweep for each combination
+    - "engine", "replicates", "level", "seed", "workers" : see sim.runSim
+    - "output", "format"  : results file, where {field} is replaced by the
+      value of the field in the sweep (e.g. "out/T{nPeriods}_a{alpha}.csv")
+    - "cache", "checkpoints" : directories of the cell cache and checkpoints
+    - "store"             : directory of a memory-mapped store of every
+      period of every replicate (see cube.py), formatted as "output"
+    - "adaptive"          : tolerance of an adaptive p0 grid (runSim only,
+      see adaptive.py)
+    - "precision"         : width of the confidence interval of nE and nI
+      at which the replicates of a cell stop, "replicates" being the most
+      it runs (see sim.runSim)
+ Relative paths are taken from the directory of the manifest. Every
+ manifest is checked before any sweep is run. A sweep that fails is
+ reported and the batch goes on; the exit code is 1 if any sweep failed.
+
+ With --shard i/N only the i-th of N shards of each sweep is run (see
+ shard.py), and saved next to its output; once every shard is done,
+ --merge writes the outputs, the same as a run of the whole sweeps. Shards
+ use the workers of their sweep, but no store, cache or checkpoints.
+
+ Execute with:
+ > python batch.py sweeps.json --summary summary.json
+ > python batch.py sweeps.json --shard 0/4      #  on each node, 0/4 to 3/4
+ > python batch.py sweeps.json --merge
+
+ Example of manifest:
+ > {"nE": [1000], "ratio": [0.8, 1.0, 1.2], "nPeriods": [5, 10],
+ >  "engine": "numpy", "replicates": 100, "seed": 1,
+ >  "output": "results/summary_{nPeriods}.parquet"}
+
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+
+
+# fields of a sweep and their default values
+DEFAULTS = {"name": None, "func": "runSim", "nE": [1000], "nN": None,
+"ratio": None, "alpha": 0.8, "nPeriods": 5, "deltaE": 0.8, "deltaN": 1.2,
+"pThreshold": 0.2, "pNewE": 1.2, "pNewI": 1.2, "p0L": 0.15, "p0H": 0.25,
+"engine": "numpy", "replicates": 1, "level": 0.95, "seed": None,
+"workers": 1, "output": "summary_{nPeriods}.csv", "format": None,
+"cache": None, "checkpoints": None, "adaptive": None, "precision": None,
+"store": None}
+
+# scalar parameters which can be given as a grid (list of values)
+GRID = ["alpha", "nPeriods", "deltaE", "deltaN", "pThreshold", "pNewE",
+"pNewI", "p0L", "p0H"]
+
+FUNCS = ["runSim", "runSimTime"]
+
+
+def readManifest(path):
+    """
+    Return the content of a JSON or TOML manifest.
+    """
+
+    if os.path.splitext(path)[1].lower() == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError("tomli is needed to read '{0}' with this "
+                "version of Python".format(path))
+        with open(path, "rb") as manifest:
+            return tomllib.load(manifest)
+
+    with open(path) as manifest:
+        return json.load(manifest)
+
+def expandGrid(sweep):
+    """
+    Return the sweeps of the grid of a sweep, one for each combination of
+    the values of the GRID fields given as lists (and of nE, if nN is given
+    as ratios of several nE), along with these values.
+    """
+
+    names = [name for name in GRID if isinstance(sweep[name], list)]
+    grid = [(dict(sweep, **dict(zip(names, values))), dict(zip(names,
+    values))) for values in itertools.product(*[sweep[name] for name in
+    names])]
+    if sweep["ratio"] is None or not isinstance(sweep["nE"], list) or \
+    len(sweep["nE"]) < 2:
+        return grid
+
+    # the players nN = ratio*nE of each nE make no grid (nE, nN)
+    return [(dict(gridSweep, nE=[nE]), dict(point, nE=nE)) for gridSweep,
+    point in grid for nE in sweep["nE"]]
+
+def checkSweep(sweep):
+    """
+    Raise ValueError if a sweep (with all its fields) cannot be run.
+    """
+
+    if sweep["func"] not in FUNCS:
+        raise ValueError("Unknown func '{0}'".format(sweep["func"]))
+    if (sweep["nN"] is None) == (sweep["ratio"] is None):
+        raise ValueError("Give either nN or ratio")
+    for name in ("nE", "nN", "ratio"):
+        if sweep[name] is not None and not isinstance(sweep[name], list):
+            raise ValueError("{0} must be a list".format(name))
+    if sweep["ratio"] is not None and len(sweep["nE"]) != 1:
+        raise ValueError("ratio needs one nE per sweep")
+    if int(sweep["nPeriods"]) < 1 or int(sweep["replicates"]) < 1:
+        raise ValueError("nPeriods and replicates must be positive")
+    if sweep["adaptive"] is not None and sweep["func"] != "runSim":
+        raise ValueError("adaptive needs func runSim")
+    if sweep["precision"] is not None and int(sweep["replicates"]) < 2:
+        raise ValueError("precision needs at least 2 replicates")
+    if sweep["store"] is not None and sweep["adaptive"] is not None:
+        raise ValueError("store needs a fixed grid of p0 (no adaptive)")
+
+    import sim
+    sim.getEngine(sweep["engine"])
+
+def getSweeps(path):
+    """
+    Return the sweeps of a manifest, with all their fields, and their output
+    paths formatted and taken from the directory of the manifest.
+    """
+
+    manifest = readManifest(path)
+    if not isinstance(manifest, dict):
+        raise ValueError("{0}: a manifest is a table of fields".format(path))
+    entries = manifest.pop("sweeps", [{}])
+    base = os.path.dirname(os.path.abspath(path))
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    sweeps = []
+    for i, entry in enumerate(entries):
+        where = "{0}, sweep {1}".format(path, i)
+        fields = dict(manifest, **entry)
+        unknown = sorted(set(fields) - set(DEFAULTS))
+        if unknown:
+            raise ValueError("{0}: unknown fields {1}".format(where,
+            ", ".join(unknown)))
+
+        if fields.get("name") is None:
+            fields["name"] = "{0}/{1}".format(stem, i)
+        for sweep, point in expandGrid(dict(DEFAULTS, **fields)):
+            try:
+                checkSweep(sweep)
+                values = dict(sweep, **point)
+                sweep["output"] = sweep["output"].format(**values)
+                if sweep["store"] is not None:
+                    sweep["store"] = sweep["store"].format(**values)
+            except (KeyError, ValueError) as error:
+                raise ValueError("{0}: {1}".format(where, error))
+            if point:
+                sweep["name"] += "[{0}]".format(",".join("{0}={1}".format(
+                name, value) for name, value in point.items()))
+            sweep["grid"] = point
+            for name in ("output", "cache", "checkpoints", "store"):
+                if sweep[name] is not None:
+                    sweep[name] = os.path.join(base, sweep[name])
+            sweeps.append(sweep)
+    return sweeps
+
+def getNSet(sweep):
+    """
+    Return the numbers of inexperienced players of a sweep.
+    """
+
+    if sweep["nN"] is not None:
+        return sweep["nN"]
+    nE, = sweep["nE"]
+    return sorted({int(ratio*nE) for ratio in sweep["ratio"]})
+
+def getShardFile(sweep, shard, nShards):
+    """
+    Return the file of a shard of a sweep, next to its output.
+    """
+    return "{0}.shard{1}of{2}.npz".format(sweep["output"], shard, nShards)
+
+def runShard(sweep, progress, shard, nShards):
+    """
+    Run a shard of a sweep (see shard.py).
+    """
+
+    import sim
+    from shard import runShard
+
+    params = sim.Params(sweep["alpha"], int(sweep["nPeriods"]),
+    sweep["deltaE"], sweep["deltaN"], sweep["pThreshold"], sweep["pNewE"],
+    sweep["pNewI"])
+    if sweep["func"] == "runSim":
+        vals = sim.getGrid()
+    else:
+        vals = [sweep["p0L"], sweep["p0H"]]
+    runShard(sweep["nE"], getNSet(sweep), vals, params, shard, nShards,
+    getShardFile(sweep, shard, nShards), sweep["engine"],
+    int(sweep["replicates"]), sweep["seed"], sweep["func"] == "runSimTime",
+    sweep["workers"], progress)
+
+def mergeShards(sweep):
+    """
+    Merge the shards of a sweep into its output (see shard.py).
+    """
+
+    from shard import mergeShards
+
+    files = sorted(glob.glob(glob.escape(sweep["output"]) +
+    ".shard*of*.npz"))
+    mergeShards(files, sweep["output"], sweep["format"], sweep["level"],
+    frame=False)
+
+def runSweep(sweep, progress, shard=None, merge=False):
+    """
+    Run a sweep quietly, or only its shard (i, N), or merge its shards, and
+    return its summary.
+    """
+
+    import sim
+    from cache import CellCache
+
+    nNSet = getNSet(sweep)
+    args = [sweep["nE"], nNSet, sweep["alpha"], int(sweep["nPeriods"]),
+    sweep["deltaE"], sweep["deltaN"], progress]
+    if sweep["func"] == "runSimTime":
+        args += [sweep["p0L"], sweep["p0H"]]
+    args += [sweep["pThreshold"], sweep["pNewE"], sweep["pNewI"]]
+
+    kwargs = {}
+    if sweep["adaptive"] is not None:
+        kwargs["adaptive"] = sweep["adaptive"]
+    if sweep["precision"] is not None:
+        kwargs["precision"] = sweep["precision"]
+    if sweep["store"] is not None:
+        kwargs["store"] = sweep["store"]
+
+    cache = None
+    if sweep["cache"] is not None:
+        cache = CellCache(path=sweep["cache"])
+    os.makedirs(os.path.dirname(sweep["output"]), exist_ok=True)
+
+    summary = {"name": sweep["name"], "grid": sweep["grid"], "output":
+    sweep["output"]}
+    if shard is not None:
+        summary["output"] = getShardFile(sweep, *shard)
+    start = time.perf_counter()
+    try:
+        if shard is not None:
+            runShard(sweep, progress, *shard)
+        elif merge:
+            mergeShards(sweep)
+        else:
+            getattr(sim, sweep["func"])(*args, engine=sweep["engine"],
+            replicates=int(sweep["replicates"]), level=sweep["level"],
+            workers=sweep["workers"], seed=sweep["seed"],
+            output=sweep["output"], format=sweep["format"], cache=cache,
+            checkpoints=sweep["checkpoints"], **kwargs)
+        summary["status"] = "ok"
+    except Exception as error:
+        summary["status"] = "failed"
+        summary["error"] = "{0}: {1}".format(type(error).__name__, error)
+
+    stats = progress.getStats()
+    summary.update({"cells": stats["cells"], "agents": stats["agents"],
+    "seconds": time.perf_counter() - start})
+    return summary
+
+def main(argv):
+    '''
+    Entry point.
+    '''
+
+    from progress import PrintProgress, Progress
+
+    parser = argparse.ArgumentParser(description="Run sweep manifests")
+    parser.add_argument("manifests", nargs="+", help="JSON or TOML files")
+    parser.add_argument("--workers", type=int,
+    help="worker processes of every sweep (0: all the cores)")
+    parser.add_argument("--summary", help="also write the summary here")
+    parser.add_argument("--progress", action="store_true",
+    help="show the progress of each sweep on stderr")
+    parser.add_argument("--check", action="store_true",
+    help="check the manifests and list the sweeps, without running them")
+    parser.add_argument("--shard", metavar="i/N",
+    help="run only the i-th of N shards of each sweep (0 <= i < N)")
+    parser.add_argument("--merge", action="store_true",
+    help="merge the shards of each sweep into its output")
+    args = parser.parse_args(argv)
+
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = tuple(int(v) for v in args.shard.split("/"))
+            if len(shard) != 2 or not 0 <= shard[0] < shard[1]:
+                raise ValueError
+        except ValueError:
+            sys.stderr.write("--shard takes i/N, with 0 <= i < N\n")
+            return 2
+    if shard is not None and args.merge:
+        sys.stderr.write("--shard and --merge cannot be used together\n")
+        return 2
+
+    try:
+        sweeps = [sweep for path in args.manifests for sweep in
+        getSweeps(path)]
+    except (OSError, ValueError, ImportError) as error:
+        sys.stderr.write("{0}\n".format(error))
+        return 2
+
+    outputs = [sweep["output"] for sweep in sweeps]
+    outputs += [sweep["store"] for sweep in sweeps if sweep["store"] is not
+    None]
+    if len(set(outputs)) < len(outputs):
+        sys.stderr.write("Several sweeps write to the same output: put "
+        "their grid fields in it, e.g. summary_{nPeriods}.csv (and {nE} "
+        "with ratio and several nE)\n")
+        return 2
+
+    if shard is not None or args.merge:
+        for sweep in sweeps:
+            if sweep["adaptive"] is not None or sweep["precision"] is not None:
+                sys.stderr.write("{0}: shards need a fixed grid and number "
+                "of replicates\n".format(sweep["name"]))
+                return 2
+            used = [name for name in ("store", "cache", "checkpoints") if
+            sweep[name] is not None]
+            if used:
+                sys.stderr.write("{0}: shards have no {1}\n".format(
+                sweep["name"], ", ".join(used)))
+                return 2
+
+    if args.check:
+        for sweep in sweeps:
+            print("{0:30s} {1}".format(sweep["name"], sweep["output"]))
+        return 0
+
+    results = []
+    start = time.perf_counter()
+    for sweep in sweeps:
+        if args.workers is not None:
+            sweep["workers"] = args.workers if args.workers > 0 else None
+        progress = PrintProgress() if args.progress else Progress()
+        results.append(runSweep(sweep, progress, shard, args.merge))
+
+    nFailed = sum(res["status"] != "ok" for res in results)
+    summary = {"sweeps": len(results), "failed": nFailed, "cells":
+    sum(res["cells"] for res in results), "agents": sum(res["agents"] for
+    res in results), "seconds": time.perf_counter() - start, "results":
+    results}
+
+    json.dump(summary, sys.stdout, indent=1)
+    sys.stdout.write("\n")
+    if args.summary is not None:
+        with open(args.summary, "w") as output:
+            json.dump(summary, output, indent=1)
+
+    return 1 if nFailed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,287 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Benchmarks of the simulation engines.
+
+ Every case times one call of sim.runSim (whole p0 grid) or sim.runSimTime
+ (two values of p0) for an engine, nE, ratio nN/nE, nPeriods and entrant
+ fraction pNewE = pNewI, in a fresh process so that its peak memory (max
+ RSS) can be measured. A small run of the same engine comes first, so that
+ the imports (pandas, Numba and its cache) are not timed. The number of
+ agents of each case (players times periods) is first estimated with the
+ meanfield engine, and the cases above the limit of their engine are
+ skipped (the population can grow geometrically with pNew).
+
+ Execute with:
+ > python benchmark.py --quick --save baseline.json
+ > python benchmark.py --quick --compare baseline.json
+
+ With --compare the exit code is 1 if a case is slower (or takes more
+ memory) than in the baseline by more than the tolerance.
+
+ With --parity the jit engine (compiled and run by Python) is checked
+ against the numpy engine on a few cells: the trajectories must be the
+ same, replicate by replicate, otherwise the exit code is 1.
+ > python benchmark.py --parity
+
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ENGINES = ["object", "numpy", "cohort", "meanfield", "jit", "super"]
+
+# largest number of agents (estimated) simulated by each engine in a case;
+# super keeps at most 10**6 agents per replicate (see supersim.py)
+MAX_AGENTS = {"object": 2e6, "numpy": 5e8, "cohort": 2e9,
+"meanfield": float("inf"), "jit": 5e8, "super": 1e11}
+
+# differences below these values are noise, not regressions
+MIN_DIFF = {"wall": 0.05, "peakMB": 5.0}
+
+FULL = {"func": ["runSim", "runSimTime"], "engine": ENGINES,
+"nE": [10**3, 10**4, 10**5, 10**6, 10**7], "ratio": [0.5, 1.0, 1.5],
+"nPeriods": [2, 5, 10], "pNew": [0.0, 1.2, 3.0]}
+
+QUICK = {"func": ["runSim"], "engine": ENGINES, "nE": [10**3, 10**4],
+"ratio": [1.0], "nPeriods": [2, 5], "pNew": [0.0, 1.2]}
+
+
+def getCases(matrix):
+    """
+    Return the cases of a benchmark matrix (dict of lists of values).
+    """
+
+    names = ["func", "engine", "nE", "ratio", "nPeriods", "pNew"]
+    return [dict(zip(names, values)) for values in
+    itertools.product(*[matrix[name] for name in names])]
+
+def getId(case):
+    """
+    Return the name of a case, used to compare runs.
+    """
+    return "{func}/{engine}/nE={nE}/ratio={ratio}/T={nPeriods}/pNew={pNew}"\
+    .format(**case)
+
+def runCase(case, engine=None):
+    """
+    Run a case in this process and return the wall time (seconds) and the
+    number of agents simulated, after a warm-up run (not timed).
+    """
+
+    import sim
+
+    stats = {}
+    nN = int(case["ratio"]*case["nE"])
+    args = ([case["nE"]], [nN], 0.8, case["nPeriods"], 0.8, 1.2, stats.update)
+    kwargs = {"engine": engine or case["engine"], "seed": 1,
+    "output": os.path.join(tempfile.mkdtemp(), "summary.csv")}
+
+    # first import of pandas (by the DataFrame), compilation of the engine
+    sim.runSim([10], [10], 0.8, 2, 0.8, 1.2, None, 0.2, 0.0, 0.0, **kwargs)
+
+    start = time.perf_counter()
+    if case["func"] == "runSim":
+        sim.runSim(*args, 0.2, case["pNew"], case["pNew"], **kwargs)
+    else:
+        sim.runSimTime(*args, 0.15, 0.25, 0.2, case["pNew"], case["pNew"],
+        **kwargs)
+    wall = time.perf_counter() - start
+
+    os.remove(kwargs["output"])
+    os.rmdir(os.path.dirname(kwargs["output"]))
+    return wall, stats["agents"]
+
+def getPeakMB():
+    """
+    Return the peak memory (max RSS) of this process, in MB.
+    """
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak/2**20 #  bytes
+    return peak/2**10 #  KB
+
+def measure(case, timeout=None):
+    """
+    Run a case in a fresh process and return its measures.
+    """
+
+    child = subprocess.run([sys.executable, os.path.abspath(__file__),
+    "--child", json.dumps(case)], stdout=subprocess.PIPE, timeout=timeout,
+    check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(child.stdout.decode().splitlines()[-1])
+
+def getMachine():
+    """
+    Return a description of the machine running the benchmarks.
+    """
+
+    import numpy as np
+    return {"platform": platform.platform(), "python":
+    platform.python_version(), "numpy": np.__version__, "cpus":
+    os.cpu_count(), "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+def compare(results, baseline, tolerance):
+    """
+    Print the cases that got worse than in the baseline (wall time or peak
+    memory larger by more than the tolerance, and by more than MIN_DIFF)
+    and return their number.
+    """
+
+    old = {res["id"]: res for res in baseline["cases"]}
+    nWorse = 0
+    for res in results:
+        if res["id"] not in old or "wall" not in res or "wall" not in \
+        old[res["id"]]:
+            continue
+        base = old[res["id"]]
+        for field in ("wall", "peakMB"):
+            if (res[field] > base[field]*(1.0 + tolerance) and
+            res[field] - base[field] > MIN_DIFF[field]):
+                print("REGRESSION {0} : {1} {2:.3f} -> {3:.3f}".format(
+                res["id"], field, base[field], res[field]))
+                nWorse += 1
+    return nWorse
+
+def checkParity(replicates=20, seed=1):
+    """
+    Compare the trajectories of the jit engine, compiled and not, with those
+    of the numpy engine and return the number of cells that differ.
+    """
+
+    import numpy as np
+    import jitsim
+    import sim
+    from recorders import RowRecorder
+
+    kernels = [("numpy", sim.getEngine("numpy")), ("jit", jitsim.simBatch),
+    ("python", lambda *args: jitsim.simBatch(*args, compiled=False))]
+    if not jitsim.HAS_JIT:
+        print("Numba is not installed: the jit engine runs the Python loops")
+
+    nDiff = 0
+    for nE, nN, p0, nPeriods, pNew in [(500, 500, 0.2, 5, 0.0),
+    (1000, 1500, 0.45, 5, 1.2), (2000, 1000, 0.8, 10, 1.2),
+    (100, 100, 0.95, 5, 3.0)]:
+        params = sim.Params(0.8, nPeriods, 0.8, 1.2, 0.2, pNew, pNew)
+        data = {}
+        for name, kernel in kernels:
+            recorder = RowRecorder()
+            kernel(nE, nN, p0, params, [recorder], replicates, seed)
+            data[name] = recorder.data
+
+        same = all(np.array_equal(data["numpy"], data[name], equal_nan=True)
+        for name in ("jit", "python"))
+        col = 14 + 10*(nPeriods-1) #  players (E, I) at the last period
+        final = data["numpy"][:, col:col+2]
+        print("nE={0} nN={1} p0={2} T={3} pNew={4} : {5} (final mean {6}, "
+        "sd {7})".format(nE, nN, p0, nPeriods, pNew, "same" if same else
+        "DIFFERENT", final.mean(axis=0).round(1), final.std(axis=0).round(1)))
+        nDiff += not same
+    return nDiff
+
+def main(argv):
+    '''
+    Entry point.
+    '''
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the engines")
+    parser.add_argument("--quick", action="store_true",
+    help="small matrix, to be run on every change")
+    parser.add_argument("--engine", nargs="+", choices=ENGINES)
+    parser.add_argument("--nE", nargs="+", type=int)
+    parser.add_argument("--ratio", nargs="+", type=float)
+    parser.add_argument("--nPeriods", nargs="+", type=int)
+    parser.add_argument("--pNew", nargs="+", type=float)
+    parser.add_argument("--func", nargs="+", choices=["runSim", "runSimTime"])
+    parser.add_argument("--max-agents", type=float,
+    help="limit on the agents of a case, for every engine")
+    parser.add_argument("--timeout", type=float, help="seconds per case")
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--parity", action="store_true",
+    help="check the jit engine against the numpy engine")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.parity:
+        return 1 if checkParity() > 0 else 0
+
+    if args.child is not None:
+        # measure one case and write the results on the last line
+        wall, agents = runCase(json.loads(args.child))
+        print(json.dumps({"wall": wall, "agents": agents, "agentsPerSec":
+        agents/wall if wall > 0 else 0.0, "peakMB": getPeakMB()}))
+        return 0
+
+    matrix = dict(QUICK if args.quick else FULL)
+    for name in ("engine", "nE", "ratio", "nPeriods", "pNew", "func"):
+        if getattr(args, name) is not None:
+            matrix[name] = getattr(args, name)
+
+    results = []
+    for case in getCases(matrix):
+        res = dict(case, id=getId(case))
+        estimate = runCase(case, engine="meanfield")[1]
+        limit = MAX_AGENTS[case["engine"]]
+        if args.max_agents is not None:
+            limit = min(limit, args.max_agents)
+        if estimate > limit:
+            res["skipped"] = "about {0:.3g} agents".format(estimate)
+        else:
+            try:
+                res.update(measure(case, args.timeout))
+            except subprocess.TimeoutExpired:
+                res["skipped"] = "timeout"
+        results.append(res)
+
+        if "skipped" in res:
+            print("{0:60s} skipped ({1})".format(res["id"], res["skipped"]))
+        else:
+            print("{0:60s} {1:8.3f} s {2:10.3g} agents/s {3:8.1f} MB".format(
+            res["id"], res["wall"], res["agentsPerSec"], res["peakMB"]))
+        sys.stdout.flush()
+
+    if args.save is not None:
+        with open(args.save, "w") as output:
+            json.dump({"machine": getMachine(), "cases": results}, output,
+            indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as baseline:
+            if compare(results, json.load(baseline), args.tolerance) > 0:
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
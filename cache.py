@@ -0,0 +1,174 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Cache of the cells of a sweep.
+
+ A cell is identified by all the values that determine its results: engine,
+ nE, nN, p0, the parameters of the model (alpha, nPeriods, deltaE_base,
+ deltaN_base, pThreshold, pNewE, pNewI), the number of replicates, the seed,
+ the recorders and the precision at which the replicates stop, if any.
+ Cells are kept in memory (least recently used first out) and, if a
+ directory is given, on disk as one .npz file per cell (oldest files
+ removed first once maxBytes is exceeded). Cells simulated without a seed
+ are random, and are never cached (unless the engine is "meanfield").
+
+ Usage:
+ > cache = CellCache(path="cache")
+ > df = sim.runSim(..., seed=1, cache=cache)
+
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+def getKey(cell):
+    """
+    Return the key of a cell of a sweep (see sim.runCell), or None if the
+    cell cannot be cached.
+    """
+
+    engine, nE, nN, p0, params, replicates, seed, recorderTypes, precision = \
+    cell
+    if seed is None and engine != "meanfield":
+        return None
+    key = (engine, int(nE), int(nN), float(p0),
+    tuple(float(v) for v in params), int(replicates), seed,
+    tuple(rec.__module__ + "." + rec.__name__ for rec in recorderTypes))
+    if precision is not None:
+        key += (tuple(float(v) for v in precision),)
+    return key
+
+
+class CellCache:
+    """
+    Data of the cells of a sweep (one array per recorder), kept in memory
+    (at most maxItems cells) and, if path is given, on disk (at most maxBytes
+    bytes).
+    """
+
+    def __init__(self, maxItems=1024, path=None, maxBytes=2**30):
+        self.maxItems = maxItems
+        self.path = path
+        self.maxBytes = maxBytes
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return len(self.memory)
+
+    def getFile(self, key):
+        """
+        Return the file storing a cell on disk.
+        """
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.path, name + ".npz")
+
+    def get(self, cell):
+        """
+        Return the data of a cell, or None if it is not in the cache.
+        """
+
+        key = getKey(cell)
+        if key is None:
+            return None
+
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        if self.path is not None:
+            file = self.getFile(key)
+            try:
+                with np.load(file) as npz:
+                    if npz["key"].item() == repr(key):
+                        data = [npz["arr_{0}".format(i)] for i in
+                        range(len(npz.files)-1)]
+                        os.utime(file) #  recently used
+                        self.store(key, data)
+                        self.hits += 1
+                        return data
+            except (OSError, ValueError, KeyError):
+                pass
+
+        self.misses += 1
+        return None
+
+    def put(self, cell, data):
+        """
+        Store the data of a cell (only if every recorder recorded an array).
+        """
+
+        key = getKey(cell)
+        if key is None or not all(isinstance(d, np.ndarray) for d in data):
+            return
+
+        self.store(key, data)
+        if self.path is not None:
+            file = self.getFile(key)
+            np.savez(file, *data, key=np.array(repr(key)))
+            self.evict()
+
+    def store(self, key, data):
+        """
+        Store a cell in memory, dropping the least recently used one if
+        needed.
+        """
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxItems:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache on disk takes at
+        most maxBytes bytes.
+        """
+
+        files = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files):
+            if total <= self.maxBytes:
+                break
+            os.remove(file)
+            total -= size
+
+    def clear(self):
+        """
+        Remove every cell, from memory and from disk.
+        """
+        self.memory.clear()
+        if self.path is not None:
+            for entry in os.scandir(self.path):
+                if entry.name.endswith(".npz"):
+                    os.remove(entry.path)
@@ -0,0 +1,181 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Checkpoints of the runs of the numpy engine (vecsim.simBatch).
+
+ A checkpoint holds the state of a run after the decisions of its last
+ period: the players (rep, experience, p, s), the totals after the shock,
+ the correction factor, the state of the generator of each replicate and
+ everything reported to the recorders so far. A run can then be extended to
+ more periods without simulating again the first ones: the new entrants of
+ the last period are added and the run goes on. The correction factor of
+ the first run is kept, i.e., the extended run is the first run carried on
+ for more periods, not a new run with a longer horizon: deltaN goes past
+ deltaE after the horizon (the nPeriods of the first run, kept along a
+ chain of extensions). A checkpoint is thus extended by MAX_EXTENSION of
+ its horizon at most (one period at least); longer runs start again from
+ t = 0, with their own horizon.
+
+ Usage:
+ > state = vecsim.simBatch(..., keepState=True)   #  params.nPeriods = 5
+ > state.save("cell.npz")
+ > vecsim.simBatch(..., state=loadCheckpoint("cell.npz"))  #  nPeriods = 6
+
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+MAX_EXTENSION = 0.25 #  periods added to a run, as a fraction of its horizon
+
+
+def getRngState(rng):
+    """
+    Return the state of a generator as a JSON-friendly dict.
+    """
+    return rng.bit_generator.state
+
+def setRngState(state):
+    """
+    Return a generator in a given state (see getRngState).
+    """
+    bitGenerator = getattr(np.random, state["bit_generator"])()
+    bitGenerator.state = state
+    return np.random.Generator(bitGenerator)
+
+def getKey(nE, nN, p0, params, replicates, firstRep, seed):
+    """
+    Return the values identifying the run of a checkpoint, nPeriods aside.
+    """
+    return [int(nE), int(nN), float(p0), [float(v) for v in params[:1] +
+    params[2:]], int(replicates), int(firstRep), seed]
+
+def getMaxPeriods(horizon):
+    """
+    Return the most periods a run with a given horizon can be extended to.
+    """
+    return horizon + max(1, int(MAX_EXTENSION*horizon))
+
+def getFile(directory, cell):
+    """
+    Return the file of the checkpoint of a cell of a sweep (see
+    sim.runCell), the same for any number of periods.
+    """
+
+    engine, nE, nN, p0, params, replicates, seed, recorderTypes, precision = \
+    cell
+    key = getKey(nE, nN, p0, params, replicates, 0, seed)
+    name = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+    return os.path.join(directory, name + ".npz")
+
+
+class Checkpoint:
+    """
+    State of a run of vecsim.simBatch after the decisions of its last period
+    t (see module docstring). horizon is the number of periods of the run
+    its correction was computed for.
+    """
+
+    def __init__(self, key, nPeriods, correction, rngStates, players, tot,
+    history, horizon):
+        self.key = key
+        self.nPeriods = nPeriods
+        self.horizon = horizon
+        self.correction = correction
+        self.rngStates = rngStates
+        self.players = players #  rep, exp, p, s
+        self.tot = tot
+        self.history = history
+
+    @property
+    def t(self):
+        return self.nPeriods - 1
+
+    def matches(self, nE, nN, p0, params, replicates, firstRep, seed):
+        """
+        Return True if the checkpoint can be extended to a run with the given
+        values (and more periods, within the limit of its horizon).
+        """
+        return (self.key == getKey(nE, nN, p0, params, replicates, firstRep,
+        seed) and self.horizon is not None and self.nPeriods < params[1] <=
+        getMaxPeriods(self.horizon))
+
+    def getRngs(self):
+        """
+        Return the generators of the replicates, in the state of the
+        checkpoint.
+        """
+        return [setRngState(state) for state in self.rngStates]
+
+    def replay(self, recorders):
+        """
+        Report the periods run so far to the recorders, up to the Bayes values
+        of the last period. Return the group totals over these periods.
+        """
+
+        h = self.history
+        for rec in recorders:
+            rec.initial(h["initTot"], h["initAvgP"])
+        totT = [h["initTot"]]
+        for t in range(self.nPeriods):
+            for rec in recorders:
+                rec.shock(t, h["shockTot"][:, t], h["shockAvgP"][:, t])
+            for rec in recorders:
+                rec.bayes(t, h["bayes"][:, t])
+            if t < self.t:
+                for rec in recorders:
+                    rec.period(t, h["periodTot"][:, t], h["periodAvgP"][:, t])
+                totT.append(h["periodTot"][:, t])
+        return totT
+
+    def save(self, path):
+        """
+        Store the checkpoint in a compressed .npz file.
+        """
+
+        meta = {"key": self.key, "nPeriods": self.nPeriods, "horizon":
+        self.horizon, "correction": self.correction, "rngStates":
+        self.rngStates}
+        rep, exp, p, s = self.players
+        np.savez_compressed(path, rep=rep, exp=exp, p=p, s=s, tot=self.tot,
+        meta=np.array(json.dumps(meta)), **{"h_" + name: values for name,
+        values in self.history.items()})
+
+
+def loadCheckpoint(path):
+    """
+    Return the checkpoint stored in a file (see Checkpoint.save).
+    """
+
+    with np.load(path) as npz:
+        meta = json.loads(npz["meta"].item())
+        players = [npz[name] for name in ("rep", "exp", "p", "s")]
+        history = {name[2:]: npz[name] for name in npz.files if
+        name.startswith("h_")}
+        tot = npz["tot"]
+
+    # checkpoints saved without their horizon are never extended
+    return Checkpoint(meta["key"], meta["nPeriods"], meta["correction"],
+    meta["rngStates"], players, tot, history, meta.get("horizon"))
@@ -0,0 +1,220 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Cohort engine for the Entrepreneurship survival model.
+
+ Players of the same group who entered in the same period (a cohort) go
+ through the same updateExperience and updateBelief maps, so that the
+ individual probability of each of them is p = A*v + B, v being the
+ probability at entry and (A, B) being shared by the whole cohort. A cohort
+ stores v and s once, and every update of the beliefs only changes (A, B).
+
+ The players of a cohort are stored in the (random) order in which they were
+ drawn. Since the shock does not depend on v or s, keeping the first
+ Binomial(n, p0) players of a cohort is equivalent to letting each player
+ survive with probability p0: no random number is drawn per player. The
+ decision (p > s) is a single comparison A*v + B > s over the cohort: s
+ being drawn independently for each player, there is no ordering of the
+ players that would turn it into a threshold search.
+
+ Select it with:
+ > sim.runSim(..., engine="cohort")
+
+"""
+
+import numpy as np
+
+import sim
+from profiler import NULL_PROFILER
+from sim import varE, varN, varSE, varSN
+
+
+class Cohort:
+    """
+    Players of one group who entered in the same period.
+    """
+
+    def __init__(self, experience, v, s):
+        self.experience = experience
+        self.v = v #  individual probabilities at entry
+        self.s = s
+        self.A = 1.0
+        self.B = 0.0
+
+    def __len__(self):
+        return len(self.v)
+
+    def sumP(self):
+        """
+        Return the sum of the current individual probabilities.
+        """
+        return self.A*self.v.sum() + self.B*len(self.v)
+
+    def thin(self, rng, p0):
+        """
+        Shock: each player survives with probability p0.
+        """
+        k = rng.binomial(len(self.v), p0)
+        self.v = self.v[:k]
+        self.s = self.s[:k]
+
+    def update(self, a, b):
+        """
+        Apply p = a*p + b to all the players.
+        """
+        self.A = a*self.A
+        self.B = a*self.B + b
+
+    def makeDecision(self):
+        """
+        Keep the players whose current probability is above s.
+        """
+        stay = self.A*self.v + self.B > self.s
+        self.v = self.v[stay]
+        self.s = self.s[stay]
+
+
+def newCohort(rng, experience, n, delta, var, varS, p0, s0):
+    """
+    Generate n new players of a given group (see Entrepreneur.__init__) and
+    return the cohort of those who decide to enter.
+    """
+
+    if n == 0 or np.isnan(p0):
+        # nobody enters a group with no survivors (p0 is nan)
+        return Cohort(experience, np.empty(0), np.empty(0))
+
+    v = np.maximum(delta*p0 + rng.normal(0.0, var, n), 0.0)
+    s = s0 + rng.normal(0.0, varS, n)
+    enter = v > s
+
+    return Cohort(experience, v[enter], s[enter])
+
+def getStats(cohorts, needsAvgP):
+    """
+    Return the totals and (if needed) the average individual probabilities of
+    the cohorts of each replicate, as arrays indexed by replicate and
+    experience.
+    """
+
+    tot = np.zeros((len(cohorts), 2), dtype=np.int64)
+    sumP = np.zeros((len(cohorts), 2))
+    for r, cohortsR in enumerate(cohorts):
+        for c in cohortsR:
+            tot[r, c.experience] += len(c)
+            if needsAvgP:
+                sumP[r, c.experience] += c.sumP()
+    if not needsAvgP:
+        return tot, None
+    return tot, np.divide(sumP, tot, out=np.full(sumP.shape, np.nan),
+    where=tot > 0)
+
+def simBatch(nE, nN, p0, params, recorders, replicates=1, seed=None,
+firstRep=0, profiler=NULL_PROFILER):
+    """
+    Simulate replicates firstRep, ..., firstRep+replicates-1 of the cell (nE,
+    nN, p0) of the sweep, the population of each replicate being stored as a
+    list of cohorts, and report each period to the recorders (see
+    recorders.Recorder). Each replicate draws from its own generator (see
+    sim.getSeedSequence). The time spent in each phase of the period goes to
+    the profiler (see profiler.py).
+    """
+
+    alpha, nPeriods, deltaE_base, deltaN_base, pThreshold, pNewE, pNewI = params
+    deltaE, deltaN = sim.getDeltas(p0, pThreshold, deltaE_base, deltaN_base)
+    correction = sim.getCorrection(deltaE, deltaN, nPeriods)
+    s0 = min(deltaE, deltaN)*p0
+
+    rngs = [np.random.default_rng(sim.getSeedSequence(seed, nE, nN, p0, r))
+    for r in range(firstRep, firstRep+replicates)]
+    needsAvgP = any(rec.needsAvgP for rec in recorders)
+    sim.notify(recorders, "start", nE, nN, p0, s0, nPeriods, replicates)
+
+    # step 0 : generate the initial population (see sim.py)
+    profiler.phase("init")
+    cohorts = [[newCohort(rng, 1, nE, deltaE, varE, varSE, p0, s0)] for rng
+    in rngs]
+
+    profiler.phase("stats")
+    tot, avgP = getStats(cohorts, needsAvgP)
+    totT = [tot] #  group totals over all the periods
+    sim.notify(recorders, "initial", tot, avgP)
+
+    # cycle over all the periods
+    for t in range(nPeriods):
+
+        profiler.phase("shock")
+        for rng, cohortsR in zip(rngs, cohorts):
+            for c in cohortsR:
+                c.thin(rng, p0)
+
+        profiler.phase("stats")
+        tot, avgP = getStats(cohorts, needsAvgP)
+        sim.notify(recorders, "shock", t, tot, avgP)
+
+        # update experience (deltaN tends to deltaE) and beliefs
+        profiler.phase("bayes")
+        bayes = sim.getBayesTotals(t, totT, tot)
+        sim.notify(recorders, "bayes", t, bayes)
+        for r, cohortsR in enumerate(cohorts):
+            for c in cohortsR:
+                profiler.phase("belief")
+                if c.experience == 0:
+                    c.update(correction, 0.0)
+                c.update(alpha, (1.0-alpha)*bayes[r, c.experience])
+
+                # each individual persists depending on the updated beliefs
+                profiler.phase("decision")
+                c.makeDecision()
+            cohorts[r] = [c for c in cohortsR if len(c) > 0]
+
+        # add new entrants at the end of the period
+        profiler.phase("entrants")
+        if t < nPeriods-1:
+            totAux, avgPAux = getStats(cohorts, True)
+            for r, rng in enumerate(rngs):
+                newE = int(pNewE*tot[r, 1])
+                cohorts[r].append(newCohort(rng, 1, newE, 1.0, varE, varSE,
+                avgPAux[r, 1], s0))
+
+                if t > 0:
+                    newN = int(pNewI*tot[r, 0])
+                    cohorts[r].append(newCohort(rng, 0, newN, 1.0, varN,
+                    varSN, avgPAux[r, 0], s0))
+
+        # first, let us add the inexperienced if it is first period
+        if t == 0:
+            for r, rng in enumerate(rngs):
+                cohorts[r].append(newCohort(rng, 0, nN, deltaN, varN, varSN,
+                p0, s0))
+
+        profiler.phase("stats")
+        tot, avgP = getStats(cohorts, needsAvgP)
+        totT.append(tot)
+        sim.notify(recorders, "period", t, tot, avgP)
+
+        if sim.isExtinct(t, nPeriods, tot):
+            totT += sim.notifyExtinct(recorders, t+1, nPeriods, tot, needsAvgP,
+            profiler)
+            break
+
+    sim.notify(recorders, "final", totT[nPeriods])
+    profiler.stop()
@@ -0,0 +1,205 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Results of a sweep as one array.
+
+ The metrics of every period (see recorders.METRICS) of every replicate of
+ every cell are stored in a preallocated array with axes
+
+    (nE, nN, p0, replicate, period, metric)
+
+ named in AXES, the values along each axis being in coords (period 0 is the
+ population at t = 0). The metrics of a period follow the order of the
+ fields of the csv file, so that the row of a replicate (see
+ recorders.getHeader) is the cell fields (nrE, nrI, p0, S0), the block of
+ the replicate flattened (less the metrics not reported at t = 0) and the
+ final counts. The number of players of each period (the long layout of
+ runSimTime) is the slice [..., 6:8] of the metric axis.
+
+ Sweeps too large for the memory are kept in a store instead: a directory
+ holding the array as a memory-mapped .npy file (data.npy), the flags of
+ the cells done (done.npy, used.npy, horizon.npy) and a small JSON header
+ (meta.json)
+ with the axes, their values and the names of the metrics. The cells are
+ written to the files as they are done, and openCube maps the files
+ without reading them: slicing cube.data reads only the slice from disk.
+
+ Usage:
+ > cube = sim.runCube(nESet, nNSet, vals, params, replicates=100, seed=1)
+ > cube.data[:, :, :, :, -1, 6]     #  final number of E players
+ > cube.getRows(0, 1, 2)            #  csv rows of the cell (0, 1, 2)
+ > sim.runSim(..., store="sweep")   #  or runCube(..., store="sweep")
+ > cube = openCube("sweep")
+ > sim.getCountTable(cube, index=(slice(None), 2))  #  cells of nNSet[2]
+
+"""
+
+import json
+import os
+
+import numpy as np
+
+from recorders import METRICS
+
+
+AXES = ("nE", "nN", "p0", "replicate", "period", "metric")
+
+VERSION = 1 #  layout of the files of a store
+
+NR_SKIPPED = 6 #  metrics of t = 0 not reported (shock and Bayes values)
+
+
+class ResultCube:
+    """
+    Metrics of a sweep, of shape (len(nESet), len(nNSet), len(vals),
+    replicates, nPeriods+1, len(METRICS)), nan until the cell is done (0 in
+    a store, i.e., if path, a directory, is given: see openCube). s0
+    holds the threshold S0 of each value of p0, and done flags the cells
+    stored. If sequential, cells may stop before all the replicates (see
+    sim.runBatches): used holds the number of replicates of each cell, the
+    others being nan. If checkpoints, cells may extend runs with fewer
+    periods (see checkpoint.py): horizon holds the number of periods of the
+    correction of each cell (nPeriods unless extended).
+    """
+
+    def __init__(self, nESet, nNSet, vals, replicates, nPeriods, s0,
+    sequential=False, path=None, checkpoints=False):
+        self.coords = {"nE": np.array(nESet), "nN": np.array(nNSet), "p0":
+        np.array(vals, dtype=float), "replicate": np.arange(replicates),
+        "period": np.arange(nPeriods+1), "metric": np.array(METRICS)}
+        self.s0 = np.array(s0, dtype=float)
+        self.sequential = sequential
+        self.checkpoints = checkpoints
+        self.path = path
+        shape = tuple(len(self.coords[axis]) for axis in AXES)
+        if path is None:
+            self.data = np.full(shape, np.nan)
+            self.done = np.zeros(shape[:3], dtype=bool)
+            self.used = np.zeros(shape[:3], dtype=np.int64)
+            self.horizon = np.full(shape[:3], nPeriods, dtype=np.int64)
+            return
+
+        # the files are created empty (sparse): nothing is written but the
+        # cells done
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "meta.json"), "w") as meta:
+            json.dump(self.getMeta(), meta, indent=1)
+        openMap = np.lib.format.open_memmap
+        self.data = openMap(os.path.join(path, "data.npy"), "w+", np.float64,
+        shape)
+        self.done = openMap(os.path.join(path, "done.npy"), "w+", bool,
+        shape[:3])
+        self.used = openMap(os.path.join(path, "used.npy"), "w+", np.int64,
+        shape[:3])
+        self.horizon = openMap(os.path.join(path, "horizon.npy"), "w+",
+        np.int64, shape[:3])
+        self.horizon[...] = nPeriods
+
+    @property
+    def cells(self):
+        """
+        Number of cells of the sweep.
+        """
+        return self.done.size
+
+    def getIndex(self, n):
+        """
+        Return the index (i, j, k) of the n-th cell, in the order of the
+        sweep.
+        """
+        return np.unravel_index(n, self.done.shape)
+
+    def store(self, index, block, horizon=None):
+        """
+        Store the block (replicates, nPeriods+1, metric) of the cell index,
+        possibly with fewer replicates if sequential, and its horizon if
+        given.
+        """
+
+        self.data[index][:len(block)] = block
+        self.data[index][len(block):] = np.nan
+        self.done[index] = True
+        self.used[index] = len(block)
+        if horizon is not None:
+            self.horizon[index] = horizon
+
+    def getMeta(self):
+        """
+        Return the header of the store of the cube (see openCube).
+        """
+
+        return {"version": VERSION, "axes": list(AXES), "shape":
+        [len(self.coords[axis]) for axis in AXES], "dtype": "float64",
+        "coords": {axis: self.coords[axis].tolist() for axis in AXES}, "s0":
+        self.s0.tolist(), "sequential": self.sequential, "checkpoints":
+        self.checkpoints}
+
+    def flush(self):
+        """
+        Write the cells stored to the files of the store, if any.
+        """
+
+        if self.path is not None:
+            for values in (self.data, self.done, self.used, self.horizon):
+                if isinstance(values, np.memmap):
+                    values.flush()
+
+    def getRows(self, i, j, k):
+        """
+        Return the rows of the csv file (see recorders.getHeader) of the
+        replicates run of the cell (i, j, k), as an array.
+        """
+
+        block = self.data[i, j, k][:self.used[i, j, k]]
+        replicates = len(block)
+        cell = [self.coords["nE"][i], self.coords["nN"][j],
+        self.coords["p0"][k], self.s0[k]]
+        return np.concatenate((np.tile(cell, (replicates, 1)),
+        block.reshape(replicates, -1)[:, NR_SKIPPED:], block[:, -1, 6:8]),
+        axis=1)
+
+
+def openCube(path, mode="r"):
+    """
+    Return the cube of a store (see ResultCube), its arrays being mapped to
+    the files rather than read: only the slices used are read from disk.
+    With mode "r+" the cells can be stored again.
+    """
+
+    with open(os.path.join(path, "meta.json")) as meta:
+        meta = json.load(meta)
+    if meta.get("version") != VERSION or meta["axes"] != list(AXES):
+        raise ValueError("{0} is not a store of this version".format(path))
+
+    cube = ResultCube.__new__(ResultCube)
+    cube.coords = {axis: np.array(meta["coords"][axis]) for axis in AXES}
+    cube.coords["p0"] = cube.coords["p0"].astype(float)
+    cube.s0 = np.array(meta["s0"], dtype=float)
+    cube.sequential = meta["sequential"]
+    cube.checkpoints = meta["checkpoints"]
+    cube.path = path
+    cube.data = np.load(os.path.join(path, "data.npy"), mmap_mode=mode)
+    cube.done = np.load(os.path.join(path, "done.npy"), mmap_mode=mode)
+    cube.used = np.load(os.path.join(path, "used.npy"), mmap_mode=mode)
+    cube.horizon = np.load(os.path.join(path, "horizon.npy"), mmap_mode=mode)
+    if list(cube.data.shape) != meta["shape"]:
+        raise ValueError("{0}: data.npy does not match meta.json".format(path))
+    return cube
@@ -0,0 +1,266 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Per-agent engine for the Entrepreneurship survival model, compiled with
+ Numba when it is installed.
+
+ The period is run as explicit loops over the players (shock,
+ updateExperience, updateBelief, makeDecision, new entrants), which can
+ hold any per-agent branching, on arrays (experience, p, s) compacted in
+ place. The random numbers are drawn outside of the loops, from the
+ generator of each replicate and in the same order as vecsim, so that the
+ compiled loops, the same loops run by Python (when Numba is missing, or
+ with compiled=False) and the numpy engine give the same values.
+
+ Select it with:
+ > sim.runSim(..., engine="jit")
+
+"""
+
+import numpy as np
+
+import sim
+from profiler import NULL_PROFILER
+from sim import varE, varN, varSE, varSN
+
+try:
+    import numba
+    HAS_JIT = True
+except ImportError:
+    HAS_JIT = False
+
+
+def jit(func):
+    """
+    Compile func with Numba if it is installed. The Python function stays
+    available as func.py_func either way.
+    """
+
+    if HAS_JIT:
+        return numba.njit(cache=True)(func)
+    func.py_func = func
+    return func
+
+
+@jit
+def shockLoop(exp, p, s, n, u, p0):
+    """
+    Shock: keep, in place, the players i < n with u[i] < p0. Return their
+    number.
+    """
+
+    k = 0
+    for i in range(n):
+        if u[i] < p0:
+            exp[k] = exp[i]
+            p[k] = p[i]
+            s[k] = s[i]
+            k += 1
+    return k
+
+@jit
+def decisionLoop(exp, p, s, n, correction, alpha, bayesN, bayesE):
+    """
+    Update experience and beliefs of the players i < n and keep, in place,
+    those who persist. Return their number.
+    """
+
+    k = 0
+    for i in range(n):
+        pi = p[i]
+        if exp[i] == 0:
+            pi = pi*correction
+            pi = alpha*pi + (1.0-alpha)*bayesN
+        else:
+            pi = alpha*pi + (1.0-alpha)*bayesE
+        if pi > s[i]:
+            exp[k] = exp[i]
+            p[k] = pi
+            s[k] = s[i]
+            k += 1
+    return k
+
+@jit
+def entrantsLoop(exp, p, s, n, experience, delta, p0, s0, zp, zs):
+    """
+    Append, from position n, the new players (given their normal draws zp
+    and zs) who decide to enter. Return the new number of players.
+    """
+
+    for j in range(len(zp)):
+        pj = delta*p0 + zp[j]
+        if pj < 0.0:
+            pj = 0.0
+        sj = s0 + zs[j]
+        if pj > sj:
+            exp[n] = experience
+            p[n] = pj
+            s[n] = sj
+            n += 1
+    return n
+
+@jit
+def sumsLoop(exp, p, n, tot, sumP):
+    """
+    Accumulate number of players and sum of probabilities per group.
+    """
+
+    tot[0] = 0
+    tot[1] = 0
+    sumP[0] = 0.0
+    sumP[1] = 0.0
+    for i in range(n):
+        tot[exp[i]] += 1
+        sumP[exp[i]] += p[i]
+
+
+class Players:
+    """
+    Players of one replicate, the first n entries of the arrays being used.
+    """
+
+    def __init__(self, capacity):
+        self.exp = np.zeros(capacity, dtype=np.int64)
+        self.p = np.zeros(capacity)
+        self.s = np.zeros(capacity)
+        self.n = 0
+
+    def reserve(self, m):
+        """
+        Make room for m more players.
+        """
+
+        if self.n + m > len(self.p):
+            capacity = max(2*len(self.p), self.n + m)
+            for name in ("exp", "p", "s"):
+                arr = getattr(self, name)
+                new = np.zeros(capacity, dtype=arr.dtype)
+                new[:self.n] = arr[:self.n]
+                setattr(self, name, new)
+
+
+def simBatch(nE, nN, p0, params, recorders, replicates=1, seed=None,
+firstRep=0, profiler=NULL_PROFILER, compiled=True):
+    """
+    Simulate replicates firstRep, ..., firstRep+replicates-1 of the cell (nE,
+    nN, p0) of the sweep, one replicate after the other within each period,
+    and report each period to the recorders (see recorders.Recorder). With
+    compiled=False (or without Numba) the loops are run by Python. The time
+    spent in each phase of the period goes to the profiler (see profiler.py).
+    """
+
+    alpha, nPeriods, deltaE_base, deltaN_base, pThreshold, pNewE, pNewI = params
+    deltaE, deltaN = sim.getDeltas(p0, pThreshold, deltaE_base, deltaN_base)
+    correction = sim.getCorrection(deltaE, deltaN, nPeriods)
+    s0 = min(deltaE, deltaN)*p0
+
+    if compiled and HAS_JIT:
+        shock, decide, enter, sums = shockLoop, decisionLoop, entrantsLoop, \
+        sumsLoop
+    else:
+        shock, decide, enter, sums = shockLoop.py_func, \
+        decisionLoop.py_func, entrantsLoop.py_func, sumsLoop.py_func
+
+    rngs = [np.random.default_rng(sim.getSeedSequence(seed, nE, nN, p0, r))
+    for r in range(firstRep, firstRep+replicates)]
+    needsAvgP = any(rec.needsAvgP for rec in recorders)
+    sim.notify(recorders, "start", nE, nN, p0, s0, nPeriods, replicates)
+
+    tot = np.zeros((replicates, 2), dtype=np.int64)
+    sumP = np.zeros((replicates, 2))
+
+    def getStats():
+        for r, pl in enumerate(players):
+            sums(pl.exp, pl.p, pl.n, tot[r], sumP[r])
+        avgP = None
+        if needsAvgP:
+            avgP = np.divide(sumP, tot, out=np.full(sumP.shape, np.nan),
+            where=tot > 0)
+        return tot.copy(), avgP
+
+    def addPlayers(pl, rng, experience, m, delta, var, varS, p0):
+        pl.reserve(m)
+        zp = rng.normal(0.0, var, m)
+        zs = rng.normal(0.0, varS, m)
+        pl.n = enter(pl.exp, pl.p, pl.s, pl.n, experience, delta, p0, s0, zp,
+        zs)
+
+    # step 0 : generate the initial population (see sim.py)
+    profiler.phase("init")
+    players = [Players(nE + nN) for r in range(replicates)]
+    for pl, rng in zip(players, rngs):
+        addPlayers(pl, rng, 1, nE, deltaE, varE, varSE, p0)
+
+    profiler.phase("stats")
+    tot0, avgP = getStats()
+    totT = [tot0] #  group totals over all the periods
+    sim.notify(recorders, "initial", tot0, avgP)
+
+    # cycle over all the periods
+    for t in range(nPeriods):
+
+        profiler.phase("shock")
+        for pl, rng in zip(players, rngs):
+            pl.n = shock(pl.exp, pl.p, pl.s, pl.n, rng.random(pl.n), p0)
+
+        profiler.phase("stats")
+        totS, avgP = getStats()
+        sim.notify(recorders, "shock", t, totS, avgP)
+
+        # update experience and beliefs, and make decisions
+        profiler.phase("bayes")
+        bayes = sim.getBayesTotals(t, totT, totS)
+        sim.notify(recorders, "bayes", t, bayes)
+        profiler.phase("decision")
+        for r, pl in enumerate(players):
+            pl.n = decide(pl.exp, pl.p, pl.s, pl.n, correction, alpha,
+            bayes[r, 0], bayes[r, 1])
+
+        # add new entrants at the end of the period
+        profiler.phase("entrants")
+        if t < nPeriods-1:
+            getStats()
+            avgPAux = np.divide(sumP, tot, out=np.full(sumP.shape, np.nan),
+            where=tot > 0)
+            for r, (pl, rng) in enumerate(zip(players, rngs)):
+                addPlayers(pl, rng, 1, int(pNewE*totS[r, 1]), 1.0, varE,
+                varSE, avgPAux[r, 1])
+                if t > 0:
+                    addPlayers(pl, rng, 0, int(pNewI*totS[r, 0]), 1.0, varN,
+                    varSN, avgPAux[r, 0])
+
+        # first, let us add the inexperienced if it is first period
+        if t == 0:
+            for pl, rng in zip(players, rngs):
+                addPlayers(pl, rng, 0, nN, deltaN, varN, varSN, p0)
+
+        profiler.phase("stats")
+        totP, avgP = getStats()
+        totT.append(totP)
+        sim.notify(recorders, "period", t, totP, avgP)
+
+        if sim.isExtinct(t, nPeriods, totP):
+            totT += sim.notifyExtinct(recorders, t+1, nPeriods, totP,
+            needsAvgP, profiler)
+            break
+
+    sim.notify(recorders, "final", totT[nPeriods])
+    profiler.stop()
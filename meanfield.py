@@ -0,0 +1,241 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Mean-field engine for the Entrepreneurship survival model.
+
+ Rather than drawing players, the engine follows the expected number of
+ players of each cohort (players of one group who entered in the same
+ period) along with the mean and covariance of their (p, s), approximated by
+ a bivariate normal distribution:
+    - new players: p = max(delta*p0 + N(0, var), 0) is replaced by a normal
+      with the moments of the censored normal, s = s0 + N(0, varS)
+    - shock: the expected number of players is multiplied by p0
+    - updateExperience, updateBelief: affine maps of p
+    - decision: the players with p - s > 0 are kept, with the moments of the
+      truncated normal
+ The number of new entrants is pNew times the expected number of players
+ (not rounded down), and the Bayes values are computed from the expected
+ totals. The results are deterministic: the seed is ignored and all the
+ replicates are the same.
+
+ Select it with:
+ > sim.runSim(..., engine="meanfield")
+
+"""
+
+import math
+
+import numpy as np
+
+import sim
+from profiler import NULL_PROFILER
+from sim import varE, varN, varSE, varSN
+
+
+def phi(z):
+    """
+    Density of the standard normal.
+    """
+    return math.exp(-0.5*z*z)/math.sqrt(2.0*math.pi)
+
+def Phi(z):
+    """
+    Cumulative distribution of the standard normal.
+    """
+    return 0.5*(1.0 + math.erf(z/math.sqrt(2.0)))
+
+def getCensoredMoments(mu, sd):
+    """
+    Return the mean and variance of max(X, 0), X being N(mu, sd^2).
+    """
+
+    if sd == 0.0:
+        return max(mu, 0.0), 0.0
+
+    z = mu/sd
+    mean = mu*Phi(z) + sd*phi(z)
+    second = (mu*mu + sd*sd)*Phi(z) + mu*sd*phi(z)
+    return mean, max(second - mean*mean, 0.0)
+
+
+class Cohort:
+    """
+    Expected number of players of a cohort (m), with the mean (mp, ms) and
+    covariance (vpp, vss, vps) of their individual probabilities and
+    thresholds.
+    """
+
+    def __init__(self, experience, m, mp, ms, vpp, vss, vps=0.0):
+        self.experience = experience
+        self.m = m
+        self.mp = mp
+        self.ms = ms
+        self.vpp = vpp
+        self.vss = vss
+        self.vps = vps
+
+    def update(self, a, b):
+        """
+        Apply p = a*p + b to all the players.
+        """
+        self.mp = a*self.mp + b
+        self.vpp = a*a*self.vpp
+        self.vps = a*self.vps
+
+    def makeDecision(self):
+        """
+        Keep the players with p > s: the cohort is truncated on d = p - s.
+        """
+
+        md = self.mp - self.ms
+        vd = self.vpp + self.vss - 2.0*self.vps
+        if vd <= 0.0:
+            if md <= 0.0:
+                self.m = 0.0
+            return
+
+        sd = math.sqrt(vd)
+        z = md/sd
+        q = Phi(z)
+        if q == 0.0:
+            self.m = 0.0
+            return
+
+        # moments of d given d > 0
+        lam = phi(z)/q
+        shift = sd*lam
+        scale = -lam*(z + lam) #  Var[d | d > 0] = vd*(1 + scale)
+
+        # regression of (p, s) on d
+        kp = (self.vpp - self.vps)/vd
+        ks = (self.vps - self.vss)/vd
+        self.m *= q
+        self.mp += kp*shift
+        self.ms += ks*shift
+        self.vpp += kp*kp*vd*scale
+        self.vss += ks*ks*vd*scale
+        self.vps += kp*ks*vd*scale
+
+
+def newCohort(experience, n, delta, var, varS, p0, s0):
+    """
+    Return the cohort of the players, out of n new players of a given group
+    (see Entrepreneur.__init__), who decide to enter (None if no one can).
+    """
+
+    if n == 0 or np.isnan(p0):
+        return None
+
+    mp, vpp = getCensoredMoments(delta*p0, var)
+    cohort = Cohort(experience, n, mp, s0, vpp, varS*varS)
+    cohort.makeDecision()
+    return cohort
+
+def getStats(cohorts):
+    """
+    Return the expected totals and the average individual probabilities of
+    the cohorts, as arrays of shape (1, 2) indexed by experience.
+    """
+
+    tot = np.zeros((1, 2))
+    sumP = np.zeros((1, 2))
+    for c in cohorts:
+        tot[0, c.experience] += c.m
+        sumP[0, c.experience] += c.m*c.mp
+    return tot, np.divide(sumP, tot, out=np.full(sumP.shape, np.nan),
+    where=tot > 0)
+
+def simBatch(nE, nN, p0, params, recorders, replicates=1, seed=None,
+firstRep=0, profiler=NULL_PROFILER):
+    """
+    Compute the expected trajectory of the cell (nE, nN, p0) of the sweep and
+    report each period to the recorders (see recorders.Recorder), once for
+    each of the replicates (all the same). The whole run is accounted to the
+    "meanfield" phase of the profiler.
+    """
+
+    alpha, nPeriods, deltaE_base, deltaN_base, pThreshold, pNewE, pNewI = params
+    deltaE, deltaN = sim.getDeltas(p0, pThreshold, deltaE_base, deltaN_base)
+    correction = sim.getCorrection(deltaE, deltaN, nPeriods)
+    s0 = min(deltaE, deltaN)*p0
+
+    sim.notify(recorders, "start", nE, nN, p0, s0, nPeriods, replicates)
+    profiler.phase("meanfield")
+
+    def notify(hook, *args):
+        # same values for every replicate
+        sim.notify(recorders, hook, *[np.repeat(arr, replicates, axis=0) if
+        isinstance(arr, np.ndarray) else arr for arr in args])
+
+    def addCohort(cohorts, cohort):
+        if cohort is not None and cohort.m > 0.0:
+            cohorts.append(cohort)
+
+    # step 0 : generate the initial population (see sim.py)
+    cohorts = []
+    addCohort(cohorts, newCohort(1, nE, deltaE, varE, varSE, p0, s0))
+
+    tot, avgP = getStats(cohorts)
+    totT = [tot] #  group totals over all the periods
+    notify("initial", tot, avgP)
+
+    # cycle over all the periods
+    for t in range(nPeriods):
+
+        # shock: each player survives with probability p0
+        for c in cohorts:
+            c.m *= p0
+
+        tot, avgP = getStats(cohorts)
+        notify("shock", t, tot, avgP)
+
+        # update experience (deltaN tends to deltaE) and beliefs
+        bayes = sim.getBayesTotals(t, totT, tot)
+        notify("bayes", t, bayes)
+        for c in cohorts:
+            if c.experience == 0:
+                c.update(correction, 0.0)
+            c.update(alpha, (1.0-alpha)*bayes[0, c.experience])
+
+            # each individual persists depending on the updated beliefs
+            c.makeDecision()
+        cohorts = [c for c in cohorts if c.m > 0.0]
+
+        # add new entrants at the end of the period
+        if t < nPeriods-1:
+            totAux, avgPAux = getStats(cohorts)
+            addCohort(cohorts, newCohort(1, pNewE*tot[0, 1], 1.0, varE, varSE,
+            avgPAux[0, 1], s0))
+
+            if t > 0:
+                addCohort(cohorts, newCohort(0, pNewI*tot[0, 0], 1.0, varN,
+                varSN, avgPAux[0, 0], s0))
+
+        # first, let us add the inexperienced if it is first period
+        if t == 0:
+            addCohort(cohorts, newCohort(0, nN, deltaN, varN, varSN, p0, s0))
+
+        tot, avgP = getStats(cohorts)
+        totT.append(tot)
+        notify("period", t, tot, avgP)
+
+    notify("final", totT[nPeriods])
+    profiler.stop()
@@ -0,0 +1,132 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Profiling of the phases of the period loop.
+
+ The kernels call profiler.phase(name) when a new phase begins (which ends
+ the previous one) and profiler.stop() at the end of the run. For each
+ phase the profiler accumulates the wall time, the number of times the phase
+ was entered and, if memory is True, the peak of the memory allocated
+ during the phase (tracemalloc, which slows down the run). The phases are:
+    - "init"       : initial population
+    - "shock"      : survival shock (step)
+    - "experience" : updateExperience
+    - "bayes"      : Bayes values (getBayes)
+    - "belief"     : updateBelief
+    - "decision"   : makeDecision and filtering (also updateExperience and
+                     updateBelief in jitsim.py, where they are one loop)
+    - "entrants"   : new entrants
+    - "merge"      : merge of super-individuals (supersim.py)
+    - "extinct"    : periods left once both groups are extinct
+    - "stats"      : totals and averages (getTotal, getAvgP) and recorders
+ When profiling is off the kernels get NULL_PROFILER, whose methods do
+ nothing.
+
+ Usage:
+ > df, profile = sim.runSim(..., profile=True)
+
+"""
+
+import time
+import tracemalloc
+
+
+class NullProfiler:
+    """
+    Profiler that records nothing.
+    """
+
+    def phase(self, name):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    """
+    Accumulate wall time, number of calls and memory peak of each phase.
+    data maps each phase to [seconds, calls, peak bytes].
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.data = {}
+        self.current = None
+        self.startTime = 0.0
+        self.startMemory = 0
+        self.tracing = False
+
+    def phase(self, name):
+        """
+        Begin a new phase, ending the current one.
+        """
+
+        now = time.perf_counter()
+        if self.current is not None:
+            self.account(now)
+        elif self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+        self.current = name
+        if self.memory:
+            tracemalloc.reset_peak()
+            self.startMemory = tracemalloc.get_traced_memory()[0]
+        self.startTime = time.perf_counter()
+
+    def account(self, now):
+        """
+        Add the current phase, ended at time now, to data.
+        """
+
+        values = self.data.setdefault(self.current, [0.0, 0, 0])
+        values[0] += now - self.startTime
+        values[1] += 1
+        if self.memory:
+            peak = tracemalloc.get_traced_memory()[1] - self.startMemory
+            values[2] = max(values[2], peak)
+
+    def stop(self):
+        """
+        End the current phase (and memory tracing, if it was started here).
+        """
+
+        if self.current is not None:
+            self.account(time.perf_counter())
+            self.current = None
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+
+def getProfiler(profile):
+    """
+    Return the profiler of a cell: NULL_PROFILER if profile is False, a
+    Profiler otherwise ("time" leaves out the memory).
+    """
+
+    if not profile:
+        return NULL_PROFILER
+    return Profiler(memory=profile != "time")
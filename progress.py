@@ -0,0 +1,190 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Progress of a sweep.
+
+ A sweep tells its progress object when each cell is done, along with the
+ number of agents simulated (players times periods, over all the
+ replicates). The progress object reports at most once every interval
+ seconds, or every time a further fraction step of the cells is done, and
+ always at the end:
+    - WidgetProgress   : moves an ipywidgets progress bar (the ff of the
+                         notebook)
+    - PrintProgress    : writes a status line to a stream (stderr)
+    - CallbackProgress : calls a function with the statistics (see
+                         Progress.getStats)
+
+ Usage:
+ > df = sim.runSim(..., ff, ...)                  #  widget
+ > df = sim.runSim(..., PrintProgress(), ...)     #  command line
+ > df = sim.runSim(..., print, ...)               #  any function
+
+"""
+
+import sys
+import time
+
+
+class Progress:
+    """
+    Base class of the progress objects: keep track of the cells and agents
+    done, and call report() when the throttle allows it.
+    """
+
+    def __init__(self, interval=0.5, step=0.05):
+        self.interval = interval
+        self.step = step
+        self.start(0)
+
+    def start(self, total):
+        """
+        Reset the counters for a sweep of total cells.
+        """
+        self.total = total
+        self.cells = 0
+        self.agents = 0
+        self.startTime = time.perf_counter()
+        self.lastTime = self.startTime
+        self.lastFraction = 0.0
+
+    def getStats(self):
+        """
+        Return the statistics of the sweep so far: cells done, total cells,
+        fraction done, agents simulated, agents per second, elapsed and
+        estimated remaining time (seconds).
+        """
+
+        elapsed = time.perf_counter() - self.startTime
+        fraction = self.cells/self.total if self.total > 0 else 1.0
+        rate = self.agents/elapsed if elapsed > 0 else 0.0
+        eta = elapsed*(1.0-fraction)/fraction if fraction > 0 else float("nan")
+        return {"cells": self.cells, "total": self.total,
+        "fraction": fraction, "agents": self.agents, "agentsPerSec": rate,
+        "elapsed": elapsed, "eta": eta}
+
+    def update(self, cells=1, agents=0):
+        """
+        Account for cells done, which simulated a given number of agents.
+        """
+
+        self.cells += cells
+        self.agents += agents
+        now = time.perf_counter()
+        fraction = self.cells/self.total if self.total > 0 else 1.0
+        if (now - self.lastTime >= self.interval or fraction -
+        self.lastFraction >= self.step or self.cells >= self.total):
+            self.lastTime = now
+            self.lastFraction = fraction
+            self.report(self.getStats())
+
+    def report(self, stats):
+        pass
+
+    def close(self):
+        pass
+
+
+class WidgetProgress(Progress):
+    """
+    Move a progress bar (any object with value, min and max, such as an
+    ipywidgets FloatProgress) from min to max along the sweep.
+    """
+
+    def __init__(self, bar, interval=0.2, step=0.05):
+        self.bar = bar
+        Progress.__init__(self, interval, step)
+
+    def report(self, stats):
+        low = getattr(self.bar, "min", 0.0)
+        self.bar.value = low + stats["fraction"]*(self.bar.max - low)
+
+
+class PrintProgress(Progress):
+    """
+    Write the progress of the sweep on a single line of a stream.
+    """
+
+    def __init__(self, stream=None, interval=1.0, step=0.05):
+        self.stream = stream if stream is not None else sys.stderr
+        Progress.__init__(self, interval, step)
+
+    def report(self, stats):
+        self.stream.write("\r{0:6d}/{1:d} cells  {2:10.3g} agents/s  "
+        "ETA {3:7.1f} s".format(stats["cells"], stats["total"],
+        stats["agentsPerSec"], stats["eta"]))
+        self.stream.flush()
+
+    def close(self):
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+class CallbackProgress(Progress):
+    """
+    Call a function with the statistics of the sweep (see getStats).
+    """
+
+    def __init__(self, callback, interval=0.5, step=0.05):
+        self.callback = callback
+        Progress.__init__(self, interval, step)
+
+    def report(self, stats):
+        self.callback(stats)
+
+
+class RoundsProgress(Progress):
+    """
+    Progress of a sweep run in rounds (see adaptive.py), told to a progress
+    object: the cells of each round are added to the total, rather than
+    starting over. The progress object is closed by the caller.
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.started = False
+
+    def start(self, total):
+        if self.started:
+            self.progress.total += total
+        else:
+            self.progress.start(total)
+            self.started = True
+
+    def getStats(self):
+        return self.progress.getStats()
+
+    def update(self, cells=1, agents=0):
+        self.progress.update(cells, agents)
+
+
+def getProgress(progress):
+    """
+    Return the progress object for what is passed as ff: None, a Progress, a
+    progress bar (see WidgetProgress) or a function (see CallbackProgress).
+    """
+
+    if progress is None or isinstance(progress, Progress):
+        return progress
+    if hasattr(progress, "value") and hasattr(progress, "max"):
+        return WidgetProgress(progress)
+    if callable(progress):
+        return CallbackProgress(progress)
+    raise TypeError("Unknown progress object: {0!r}".format(progress))
@@ -0,0 +1,342 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Recorders of the simulation kernels (sim.simBatch, vecsim.simBatch).
+
+ A kernel simulates a batch of replicates of one cell (nE, nN, p0) and
+ reports what happens in each period to a list of recorders, which keep only
+ the metrics they are interested in. The hooks are called in this order:
+
+    start(nE, nN, p0, s0, nPeriods, replicates)
+    initial(tot, avgP)                 #  population at t = 0
+    for t in range(nPeriods):
+        shock(t, tot, avgP)            #  after the shock of period t+1
+        bayes(t, bayes)                #  Bayes values of period t+1
+        period(t, tot, avgP)           #  after decisions and new entrants
+    final(tot)
+
+ tot, avgP and bayes are arrays of shape (replicates, 2), indexed by
+ replicate and experience (0 = I, 1 = E). avgP is None unless one of the
+ recorders sets needsAvgP, so that sweeps that do not need the averages do
+ not pay for them. Once the kernel is done, the recorded values are in the
+ data attribute of each recorder.
+
+"""
+
+import numpy as np
+
+
+def getHeader(nPeriods):
+    """
+    Return the header of the csv file, i.e., the names of the fields of each
+    row produced by a simulation run.
+    """
+
+    frow= []
+    frow.append("nrE")
+    frow.append("nrI")
+    frow.append("p0")
+    frow.append("S0")
+
+    frow.append("nrE")
+    frow.append("nrI")
+    frow.append("avgp0_E")
+    frow.append("avgp0_I")
+
+    for t in range(nPeriods):
+        frow.append("nr_E_" + str(t+1))
+        frow.append("nr_I_" + str(t+1))
+        frow.append("avgp0_E_" + str(t+1))
+        frow.append("avgp0_I_" + str(t+1))
+
+        frow.append("bayesE_" + str(t+1))
+        frow.append("bayesI_" + str(t+1))
+
+        frow.append("nrE_" + str(t+1))
+        frow.append("nrI_" + str(t+1))
+        frow.append("avgp0_E_" + str(t+1))
+        frow.append("avgp0_I_" + str(t+1))
+
+    frow.append("nE")
+    frow.append("nI")
+
+    return frow
+
+
+# metrics of each period, as in the fields of the csv file: after the shock,
+# Bayes values, after decisions and new entrants (only these at t = 0)
+METRICS = ["nE_shock", "nI_shock", "avgpE_shock", "avgpI_shock", "bayesE",
+"bayesI", "nE", "nI", "avgpE", "avgpI"]
+
+
+class Recorder:
+    """
+    Base class of the recorders: every hook does nothing.
+    """
+
+    needsAvgP = False
+
+    def __init__(self):
+        self.data = None
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        pass
+
+    def initial(self, tot, avgP):
+        pass
+
+    def shock(self, t, tot, avgP):
+        pass
+
+    def bayes(self, t, bayes):
+        pass
+
+    def period(self, t, tot, avgP):
+        pass
+
+    def final(self, tot):
+        pass
+
+
+class RowRecorder(Recorder):
+    """
+    Record, for each replicate, the full row of the csv file (see getHeader).
+    data has shape (replicates, nr. of fields).
+    """
+
+    needsAvgP = True
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        self.data = np.empty((replicates, len(getHeader(nPeriods))))
+        self.data[:, :4] = nE, nN, p0, s0
+
+    def store(self, col, values):
+        """
+        Store values (indexed by experience) in fields col (E) and col+1 (I).
+        """
+        self.data[:, col:col+2] = values[:, ::-1]
+
+    def initial(self, tot, avgP):
+        self.store(4, tot)
+        self.store(6, avgP)
+
+    def shock(self, t, tot, avgP):
+        self.store(8 + 10*t, tot)
+        self.store(10 + 10*t, avgP)
+
+    def bayes(self, t, bayes):
+        self.store(12 + 10*t, bayes)
+
+    def period(self, t, tot, avgP):
+        self.store(14 + 10*t, tot)
+        self.store(16 + 10*t, avgP)
+
+    def final(self, tot):
+        self.store(self.data.shape[1] - 2, tot)
+
+
+class CubeRecorder(Recorder):
+    """
+    Record every metric (see METRICS) of every period, t = 0 included. data
+    has shape (replicates, nPeriods+1, nr. of metrics); the metrics not
+    reported at t = 0 are nan. This is the block of one cell of a
+    cube.ResultCube.
+    """
+
+    needsAvgP = True
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        self.data = np.full((replicates, nPeriods+1, len(METRICS)), np.nan)
+
+    def store(self, t, col, values):
+        """
+        Store values (indexed by experience) in metrics col (E) and col+1
+        (I) of period t.
+        """
+        self.data[:, t, col:col+2] = values[:, ::-1]
+
+    def initial(self, tot, avgP):
+        self.store(0, 6, tot)
+        self.store(0, 8, avgP)
+
+    def shock(self, t, tot, avgP):
+        self.store(t+1, 0, tot)
+        self.store(t+1, 2, avgP)
+
+    def bayes(self, t, bayes):
+        self.store(t+1, 4, bayes)
+
+    def period(self, t, tot, avgP):
+        self.store(t+1, 6, tot)
+        self.store(t+1, 8, avgP)
+
+
+class FinalRecorder(Recorder):
+    """
+    Record only the final number of survivors of each group. data has shape
+    (replicates, 2), indexed by experience.
+    """
+
+    def final(self, tot):
+        self.data = np.array(tot)
+
+
+class CountRecorder(Recorder):
+    """
+    Record the number of players of each group at the end of every period,
+    t = 0 included. data has shape (replicates, nPeriods+1, 2), indexed by
+    experience.
+    """
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        self.data = np.empty((replicates, nPeriods+1, 2))
+
+    def initial(self, tot, avgP):
+        self.data[:, 0] = tot
+
+    def period(self, t, tot, avgP):
+        self.data[:, t+1] = tot
+
+
+class BayesRecorder(Recorder):
+    """
+    Record the Bayes values of every period. data has shape (replicates,
+    nPeriods, 2), indexed by experience.
+    """
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        self.data = np.empty((replicates, nPeriods, 2))
+
+    def bayes(self, t, bayes):
+        self.data[:, t] = bayes
+
+
+class BeliefRecorder(Recorder):
+    """
+    Record the average individual probability of each group at the end of
+    every period, t = 0 included. data has shape (replicates, nPeriods+1, 2),
+    indexed by experience.
+    """
+
+    needsAvgP = True
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        self.data = np.empty((replicates, nPeriods+1, 2))
+
+    def initial(self, tot, avgP):
+        self.data[:, 0] = avgP
+
+    def period(self, t, tot, avgP):
+        self.data[:, t+1] = avgP
+
+
+class PrintRecorder(Recorder):
+    """
+    Print the statistics of the population along the run, as model.main
+    does (see sim.printStats).
+    """
+
+    needsAvgP = True
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        self.nE = nE
+        self.nN = nN
+        print("*"*80)
+        print("Simulation with nE = {0:5d}, nN = {1:5d}, p0 = {2:5.2f}".format(nE, nN, p0))
+        print("*"*80)
+
+    def printStats(self, t, tot, avgP):
+        for r in range(len(tot)):
+            if len(tot) > 1:
+                print("Replicate {0:3d}".format(r))
+            print("Summary STATS period {0:3d} : ".format(t))
+            print("Tot In       = ", tot[r].sum())
+            print("    %        = ", tot[r].sum()/(self.nE + self.nN))
+            print("Subtot E     = ", tot[r, 1])
+            print("Subtot N     = ", tot[r, 0])
+            print("Avg pi E     = {0:5.2f}".format(avgP[r, 1]))
+            print("Avg pi N     = {0:5.2f}".format(avgP[r, 0]))
+
+    def initial(self, tot, avgP):
+        self.printStats(0, tot, avgP)
+
+    def shock(self, t, tot, avgP):
+        self.printStats(t+1, tot, avgP)
+
+    def bayes(self, t, bayes):
+        for r in range(len(bayes)):
+            print("Bayes Beliefs :: E = {0:5.2f}, N = {1:5.2f}".format(bayes[r, 1],
+            bayes[r, 0]))
+
+    def period(self, t, tot, avgP):
+        print("After further screening and entering we get :: ")
+        self.printStats(t+1, tot, avgP)
+
+
+class HistoryRecorder(Recorder):
+    """
+    Record every value reported along the run, so that the run can be
+    replayed to other recorders (see checkpoint.Checkpoint). data is a dict
+    of arrays indexed by replicate, (period) and experience.
+    """
+
+    needsAvgP = True
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        shape = (replicates, nPeriods, 2)
+        self.data = {"initTot": np.zeros((replicates, 2), dtype=np.int64),
+        "initAvgP": np.empty((replicates, 2)),
+        "shockTot": np.zeros(shape, dtype=np.int64),
+        "shockAvgP": np.empty(shape), "bayes": np.empty(shape),
+        "periodTot": np.zeros(shape, dtype=np.int64),
+        "periodAvgP": np.empty(shape)}
+
+    def initial(self, tot, avgP):
+        self.data["initTot"][:] = tot
+        self.data["initAvgP"][:] = avgP
+
+    def shock(self, t, tot, avgP):
+        self.data["shockTot"][:, t] = tot
+        self.data["shockAvgP"][:, t] = avgP
+
+    def bayes(self, t, bayes):
+        self.data["bayes"][:, t] = bayes
+
+    def period(self, t, tot, avgP):
+        self.data["periodTot"][:, t] = tot
+        self.data["periodAvgP"][:, t] = avgP
+
+
+class WorkRecorder(Recorder):
+    """
+    Record the number of agents simulated, i.e., the players present at the
+    beginning of each period summed over the periods and the replicates.
+    data is an int.
+    """
+
+    def start(self, nE, nN, p0, s0, nPeriods, replicates):
+        self.data = 0
+
+    def initial(self, tot, avgP):
+        self.data += int(tot.sum())
+
+    def period(self, t, tot, avgP):
+        self.data += int(tot.sum())
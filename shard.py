@@ -0,0 +1,230 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Sweeps split over several machines (or processes).
+
+ The replicates of all the cells of a sweep, i.e., the units (nE, nN, p0,
+ replicate) in the order of the sweep, are split into nShards shards of
+ consecutive units, shard i holding the units i*U//nShards, ...,
+ (i+1)*U//nShards - 1 of the U units. Each replicate has its own random
+ generator (see sim.getSeedSequence), so a shard can be run anywhere, with
+ no coordination: it simulates its pieces (runs of consecutive replicates
+ of one cell) and saves them along with the description of the sweep in
+ one .npz file. mergeShards checks that the shards of the sweep are all
+ there and cover every unit once, and writes the csv file and returns the
+ table of the sweep, the same as a run on one machine with the same seed.
+
+ Shards need a seed (unless the engine is "meanfield"), and a fixed number
+ of replicates (no precision, no adaptive grid). The pieces of a shard are
+ spread over workers processes, as the cells of sim.runSim.
+
+ Usage:
+ > runShard(nESet, nNSet, vals, params, 0, 3, "sweep.0.npz", "numpy", 100, 1)
+ > ...                                        #  shards 1 and 2, anywhere
+ > df = mergeShards(["sweep.0.npz", "sweep.1.npz", "sweep.2.npz"])
+
+ or, with a manifest (see batch.py), running the shards as processes:
+ > for i in 0 1 2; do python batch.py sweeps.json --shard $i/3 & done; wait
+ > python batch.py sweeps.json --merge
+
+"""
+
+import json
+import os
+
+import numpy as np
+
+import sim
+from cube import ResultCube
+from progress import getProgress
+from recorders import CubeRecorder, WorkRecorder
+from writers import ResultWriter
+
+
+VERSION = 1 #  layout of the shard files
+
+
+def getPieces(shape, replicates, shard, nShards):
+    """
+    Return the pieces (n, firstRep, replicates) of a shard: replicates
+    firstRep, ..., firstRep+replicates-1 of the n-th cell of the sweep, the
+    cells forming an array of the given shape.
+    """
+
+    units = int(np.prod(shape))*replicates
+    lo = shard*units//nShards
+    hi = (shard+1)*units//nShards
+    pieces = []
+    while lo < hi:
+        n, firstRep = divmod(lo, replicates)
+        count = min(replicates - firstRep, hi - lo)
+        pieces.append((int(n), int(firstRep), int(count)))
+        lo += count
+    return pieces
+
+def runPiece(piece):
+    """
+    Simulate a piece (engine, nE, nN, p0, params, replicates, seed,
+    firstRep) of a shard, and return its block (see cube.ResultCube) and the
+    number of agents simulated.
+    """
+
+    engine, nE, nN, p0, params, replicates, seed, firstRep = piece
+    recorder = CubeRecorder()
+    work = WorkRecorder()
+    sim.getEngine(engine)(nE, nN, p0, params, [recorder, work], replicates,
+    seed, firstRep=firstRep)
+    return recorder.data, work.data
+
+def getSpec(nESet, nNSet, vals, params, engine, replicates, seed, time):
+    """
+    Return the description of a sweep saved with its shards, which must be
+    the same for all of them.
+    """
+
+    if seed is None and engine != "meanfield":
+        raise ValueError("Shards need a seed")
+    return {"nE": [int(nE) for nE in nESet], "nN": [int(nN) for nN in
+    nNSet], "p0": [float(p0) for p0 in vals], "params": {name: float(value)
+    for name, value in params._asdict().items()}, "engine": engine,
+    "replicates": int(replicates), "seed": seed, "time": bool(time)}
+
+def getParams(spec):
+    """
+    Return the parameters (sim.Params) of the description of a sweep.
+    """
+
+    params = dict(spec["params"], nPeriods=int(spec["params"]["nPeriods"]))
+    return sim.Params(**params)
+
+def runShard(nESet, nNSet, vals, params, shard, nShards, path,
+engine="object", replicates=1, seed=None, time=False, workers=1,
+progress=None):
+    """
+    Simulate the shard-th of the nShards shards of the sweep (see runCube)
+    and save it to path (.npz). time tells whether the sweep is merged as
+    runSimTime (True) or runSim. Return the number of agents simulated.
+    """
+
+    if not 0 <= shard < nShards:
+        raise ValueError("Shard {0} of {1} does not exist".format(shard,
+        nShards))
+    spec = getSpec(nESet, nNSet, vals, params, engine, replicates, seed,
+    time)
+    shape = (len(nESet), len(nNSet), len(vals))
+    pieces = getPieces(shape, replicates, shard, nShards)
+
+    sim.getEngine(engine)
+    runs = []
+    for n, firstRep, count in pieces:
+        i, j, k = np.unravel_index(n, shape)
+        runs.append((engine, nESet[i], nNSet[j], vals[k], params, count, seed,
+        firstRep))
+
+    progress = getProgress(progress)
+    if progress is not None:
+        progress.start(len(pieces))
+    blocks = {}
+    agents = 0
+    for m, (block, work) in enumerate(sim.sweep(runs, workers,
+    run=runPiece)):
+        blocks["piece{0}".format(m)] = block
+        agents += work
+        if progress is not None:
+            progress.update(1, work)
+    if progress is not None:
+        progress.close()
+
+    meta = {"version": VERSION, "shard": shard, "shards": nShards, "spec":
+    spec, "pieces": pieces}
+    # a shard stopped halfway leaves no file behind
+    with open(path + ".tmp", "wb") as output:
+        np.savez(output, meta=np.array(json.dumps(meta)), **blocks)
+    os.replace(path + ".tmp", path)
+    return agents
+
+def loadShard(path):
+    """
+    Return the description (see runShard) and the blocks of the pieces of a
+    shard file.
+    """
+
+    with np.load(path) as npz:
+        meta = json.loads(npz["meta"].item())
+        if meta.get("version") != VERSION:
+            raise ValueError("{0} is not a shard of this version".format(path))
+        blocks = [npz["piece{0}".format(m)] for m in
+        range(len(meta["pieces"]))]
+    return meta, blocks
+
+def mergeShards(paths, output=None, format=None, level=0.95, frame=True):
+    """
+    Merge the shards of a sweep (their files), write the csv file of the
+    sweep to output and return its table (see sim.runSim, sim.runSimTime).
+    Raise ValueError if the shards do not make one whole sweep.
+    """
+
+    shards = [loadShard(path) for path in paths]
+    if len(shards) == 0:
+        raise ValueError("No shard to merge")
+    first = shards[0][0]
+    for path, (meta, blocks) in zip(paths, shards):
+        if meta["spec"] != first["spec"] or meta["shards"] != first["shards"]:
+            raise ValueError("{0} is a shard of another sweep".format(path))
+    nShards = first["shards"]
+    found = sorted(meta["shard"] for meta, blocks in shards)
+    missing = sorted(set(range(nShards)) - set(found))
+    if missing:
+        raise ValueError("Missing shards (of {1}): {0}".format(", ".join(
+        str(shard) for shard in missing), nShards))
+    if len(found) > nShards:
+        raise ValueError("Some shards are given twice")
+
+    spec = first["spec"]
+    params = getParams(spec)
+    replicates = spec["replicates"]
+    cube = ResultCube(spec["nE"], spec["nN"], spec["p0"], replicates,
+    params.nPeriods, sim.getThresholds(spec["p0"], params))
+
+    # every replicate of every cell must be in exactly one piece
+    cells = {}
+    units = np.zeros((cube.cells, replicates), dtype=np.int64)
+    for meta, blocks in shards:
+        for (n, firstRep, count), block in zip(meta["pieces"], blocks):
+            units[n, firstRep:firstRep+count] += 1
+            cells.setdefault(n, []).append((firstRep, block))
+    if not np.all(units == 1):
+        raise ValueError("Replicates of {0} cells are missing or given "
+        "twice".format(int(np.sum(np.any(units != 1, axis=1)))))
+
+    header = sim.getSweepHeader(params.nPeriods, replicates)
+    if output is None:
+        output = "summary_" + str(params.nPeriods) + ".csv"
+    with ResultWriter(output, header, format) as writer:
+        for n in range(cube.cells):
+            index = cube.getIndex(n)
+            cube.store(index, np.concatenate([block for firstRep, block in
+            sorted(cells[n], key=lambda piece: piece[0])]))
+            writer.write(sim.getCellSummary(cube.getRows(*index), header,
+            level))
+
+    table = sim.getCountTable(cube, level, spec["time"])
+    return table.toFrame() if frame else table
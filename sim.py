@@ -36,11 +36,23 @@
 
 """
 
+import os
 import random
 import sys
+import warnings
+from collections import deque, namedtuple
+from functools import partial
+from statistics import NormalDist
 import numpy as np
-import pandas as pd
-import csv
+
+from adaptive import AdaptiveGrid
+from profiler import NULL_PROFILER, getProfiler
+from progress import getProgress, RoundsProgress
+from cube import ResultCube
+from recorders import (getHeader, CubeRecorder, FinalRecorder, RowRecorder,
+    WorkRecorder)
+from table import concat, getFrame, Table
+from writers import ResultWriter
 
 
 # fixed parameters
@@ -51,15 +63,24 @@ varN   = 0.10
 varSE  = 0.02
 varSN  = 0.1
 
+# parameters of a sweep shared by all its cells
+Params = namedtuple("Params", ["alpha", "nPeriods", "deltaE_base",
+"deltaN_base", "pThreshold", "pNewE", "pNewI"])
+
+# sequential stopping of the replicates of a cell (see runBatches): batches
+# of batch replicates until the confidence interval (at level) of the mean
+# of both final counts is at most width players wide
+Precision = namedtuple("Precision", ["width", "batch", "level"])
+
 class Entrepreneur:
     """
     Basic data structure for management of each player.
     """
 
-    def __init__(self, experience, delta, var, varS, p0, s0):
+    def __init__(self, experience, delta, var, varS, p0, s0, rng=random):
         self.experience = experience
-        self.p = max(delta*p0 + random.gauss(0, var), 0.0)
-        self.s = s0 + random.gauss(0, varS)
+        self.p = max(delta*p0 + rng.gauss(0, var), 0.0)
+        self.s = s0 + rng.gauss(0, varS)
         self.decision = 0
         #  print("New with p = ", self.p, " and s = ", self.s)
 
@@ -91,6 +112,110 @@ class Entrepreneur:
         self.p = correction*self.p
 
 
+class Population:
+    """
+    Players of a given period. Besides the list of players, it keeps running
+    counts and sums of the individual probabilities per group (indexed by
+    experience), updated as players enter and as beliefs change, so that
+    getTotal and getAvgP do not need a pass over the players.
+
+    Note: the sums are kept up to date only while the population is the
+    current one; players are shared with the population of the next period,
+    whose updates are not reflected here (the counts, though, stay valid).
+    """
+
+    def __init__(self):
+        self.players = []
+        self.count = [0, 0]
+        self.sumP = [0.0, 0.0]
+
+    def __len__(self):
+        return len(self.players)
+
+    def __getitem__(self, i):
+        return self.players[i]
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def append(self, entr):
+        """
+        Add a player to the population.
+        """
+        self.players.append(entr)
+        self.count[entr.experience] += 1
+        self.sumP[entr.experience] += entr.p
+
+    def getTotal(self, group):
+        """
+        Return the number of players of a group.
+        """
+        return self.count[group]
+
+    def getAvgP(self, group):
+        """
+        Return the average of the individual probabilities of a group (nan if
+        the group is empty, as np.mean does).
+        """
+        if self.count[group] == 0:
+            return np.nan
+        return self.sumP[group]/self.count[group]
+
+    def updateExperience(self, correction, group=0):
+        """
+        Apply updateExperience to all the players of a group.
+        """
+        for entr in self.players:
+            if entr.experience == group:
+                entr.updateExperience(correction)
+        self.sumP[group] *= correction
+
+    def updateBelief(self, alpha, pBayes):
+        """
+        Apply updateBelief to all the players, pBayes being indexed by
+        experience.
+        """
+        for entr in self.players:
+            entr.updateBelief(alpha, pBayes[entr.experience])
+        for group in (0, 1):
+            self.sumP[group] = alpha*self.sumP[group] + \
+            (1.0-alpha)*pBayes[group]*self.count[group]
+
+
+
+class History:
+    """
+    Populations of the periods of a run, indexed by period as a list would
+    be. Only the last window generations are retained (all of them if window
+    is None), which is what the update rule needs (see getBayes: periods t
+    and t-1); the group totals of every period are kept as aggregate
+    statistics. Peak memory is then proportional to the current population
+    rather than to the sum of the populations over all the periods.
+    """
+
+    def __init__(self, window=2):
+        self.window = window
+        self.pops = deque(maxlen=window)
+        self.totals = [] #  (nr. of N, nr. of E) of every period
+
+    def __len__(self):
+        return len(self.totals)
+
+    def __getitem__(self, t):
+        if t < 0:
+            t += len(self)
+        first = len(self) - len(self.pops)
+        if t < first or t >= len(self):
+            raise IndexError("population of period {0} not retained".format(t))
+        return self.pops[t - first]
+
+    def append(self, pop):
+        """
+        Add the population of the next period.
+        """
+        self.pops.append(pop)
+        self.totals.append((getTotal(pop, 0), getTotal(pop, 1)))
+
 
 def getBayes(t, popT, pop, group, nTot):
     """
@@ -114,11 +239,34 @@ def getBayes(t, popT, pop, group, nTot):
             return getTotal(popT[t], group)/getTotal(popT[t-1], group)
 
 
+def getBayesTotals(t, totT, tot):
+    """
+    Same rule as getBayes, computed from the group totals of each period
+    rather than from the players themselves, for a batch of replicates:
+    totT[t] holds the totals at the beginning of period t and tot those of
+    the players that survived the shock of the current period, as arrays
+    indexed by replicate and experience. Return the Bayes values in the same
+    layout.
+    """
+
+    bayes = np.zeros(tot.shape)
+    for group in (0, 1):
+        # note: the "or" case was added to deal with the 1-period delay of I
+        if t == 0 or (t == 1 and group == 0):
+            num, den = tot[:, group], totT[t][:, group]
+        else:
+            num, den = totT[t][:, group], totT[t-1][:, group]
+        np.divide(num, den, out=bayes[:, group], where=den > 0)
+    return bayes
+
+
 def getTotal(pop, experience):
     """
     Return the total number of players in a group in a given period.
     """
 
+    if isinstance(pop, Population):
+        return pop.getTotal(experience)
     return sum([pop[i].experience == experience for i in range(len(pop))])
 
 def getAvgP(pop, group):
@@ -126,19 +274,21 @@ def getAvgP(pop, group):
     Return the average of the individual probabilities for a given group.
     """
 
+    if isinstance(pop, Population):
+        return pop.getAvgP(group)
     return np.mean([pop[i].p for i in range(len(pop)) if pop[i].experience ==
     group])
 
-def step(pop, p0):
+def step(pop, p0, rng=random):
     """
     One step over time, from t to t+1.
     We apply a "shock", i.e., each individual in the population has a
     probability of surviving equal to p0.
     """
     #  print("\n Moving by one period ... with p0 = ", p0, "\n")
-    popNew = []
+    popNew = Population()
     for i in range(len(pop)):
-        rr = random.random() #  a random in [0.0, 1.0)
+        rr = rng.random() #  a random in [0.0, 1.0)
         if rr < p0:
             popNew.append(pop[i])
 
@@ -158,426 +308,815 @@ def printStats(pop, t, nE, nN):
     print("Avg pi N     = {0:5.2f}".format(getAvgP(pop,0)))
 
 
-def runSim(nESet, nNSet, alpha, nPeriods, deltaE_base, deltaN_base,ff,
-pThreshold, pNewE, pNewI):
+def getDeltas(p0, pThreshold, deltaE_base, deltaN_base):
+    """
+    Return the correcting factors (deltaE, deltaN) for a given value of p0.
+    Below the threshold (rare event) E underestimates and N overestimates,
+    above the threshold the two values are swapped.
+    """
 
-    #  nESet = [1000]
-    #  ratioEvsN = [0.5, 0.8, 0.9, 1.0, 1.1, 1.2, 1.5]
+    if p0 <= pThreshold: #  rare event
+        return deltaE_base, deltaN_base
+    else:
+        return deltaN_base, deltaE_base
 
+def getCorrection(deltaE, deltaN, nPeriods):
+    """
+    Return the factor applied by updateExperience in every period, such that
+    deltaN tends to deltaE over the nPeriods periods.
+    """
 
-    # write the headers of the csv file
-    frow= []
-    frow.append("nrE")
-    frow.append("nrI")
-    frow.append("p0")
-    frow.append("S0")
+    gamma = abs(deltaE-deltaN)/nPeriods
+    if deltaE < deltaN:
+        return 1.0/(1.0+gamma)
+    else:
+        return 1.0+gamma
 
-    frow.append("nrE")
-    frow.append("nrI")
-    frow.append("avgp0_E")
-    frow.append("avgp0_I")
-     
-    for t in range(nPeriods):
-        frow.append("nr_E_" + str(t+1))
-        frow.append("nr_I_" + str(t+1))
-        frow.append("avgp0_E_" + str(t+1))
-        frow.append("avgp0_I_" + str(t+1))
-        
-        frow.append("bayesE_" + str(t+1))
-        frow.append("bayesI_" + str(t+1))
-
-        frow.append("nrE_" + str(t+1))
-        frow.append("nrI_" + str(t+1))
-        frow.append("avgp0_E_" + str(t+1))
-        frow.append("avgp0_I_" + str(t+1))
-     
-    frow.append("nE")
-    frow.append("nI")
-
-    allRows = []  #  this is used to write the csv file
-    allRows.append(frow)
-    dfEl = []
+def notify(recorders, hook, *args):
+    """
+    Call the given hook of every recorder (see recorders.Recorder).
+    """
 
-    x = np.arange(0.025, 0.27, 0.025)
-    vals = np.sqrt(x)
-    unitProgress = ff.max/(nPeriods*len(nNSet)*len(vals))
+    for rec in recorders:
+        getattr(rec, hook)(*args)
 
-    for nE in nESet:
+def isExtinct(t, nPeriods, tot):
+    """
+    Return True if both groups are extinct in every replicate at the end of
+    period t (tot is zero) and periods are left, which can then be reported
+    at once (see notifyExtinct).
+    """
 
-        for nN in nNSet:
-            #  vals    = np.arange(0.05, 0.55, 0.05)  #  range values for p0
-            #  x = np.arange(0.025, 0.27, 0.025)
-            #  vals = np.sqrt(x)
-            #  vals    = [0.1]
-            results = [] # keep track of the percentage of persistent
+    return t < nPeriods-1 and not tot.any()
 
-            for p0 in vals:  #  for every value of the objective probability p0
-                if p0 <= pThreshold: #  rare event
-                    deltaE = deltaE_base
-                    deltaN = deltaN_base
-                else:
-                    deltaE = deltaN_base
-                    deltaN = deltaE_base
-
-                gamma = abs(deltaE-deltaN)/nPeriods
-
-                frow = []
-
-                #  s0 = deltaE*p0
-                s0 = min(deltaE, deltaN)*p0
-
-                # frow is used to store information of a row of the csv file
-                frow.append(nE)
-                frow.append(nN)
-                frow.append(p0)
-                frow.append(s0)
-
-                popT = [] #  total polation (over all the periods)
-                pop = [] #  population of the current period
-                # step 0 : Generate initial population
-                for i in range(nE):
-                    entr = Entrepreneur(1, deltaE, varE, varSE, p0, s0)
+def notifyExtinct(recorders, t0, nPeriods, tot, needsAvgP,
+profiler=NULL_PROFILER):
+    """
+    Report the periods t0, ..., nPeriods-1 of a batch in which both groups
+    are extinct in every replicate at the end of period t0-1 (tot is zero):
+    nobody survives or enters anymore and the Bayes values are 0. Return the
+    totals of these periods, to be appended to those of the run.
+    """
+
+    profiler.phase("extinct")
+    avgP = np.full(tot.shape, np.nan) if needsAvgP else None
+    bayes = np.zeros(tot.shape)
+    for t in range(t0, nPeriods):
+        notify(recorders, "shock", t, tot, avgP)
+        notify(recorders, "bayes", t, bayes)
+        notify(recorders, "period", t, tot, avgP)
+    return [tot]*(nPeriods-t0)
+
+def getStats(pops, needsAvgP):
+    """
+    Return the totals and (if needed) the average individual probabilities of
+    a list of populations, one per replicate, as arrays indexed by replicate
+    and experience.
+    """
+
+    tot = np.array([[pop.getTotal(0), pop.getTotal(1)] for pop in pops])
+    if not needsAvgP:
+        return tot, None
+    return tot, np.array([[pop.getAvgP(0), pop.getAvgP(1)] for pop in pops])
+
+def getSeedSequence(seed, nE, nN, p0, rep=0):
+    """
+    Return the seed sequence of replicate rep of the cell (nE, nN, p0). It
+    only depends on the seed and on the cell itself (p0 through its exact bit
+    pattern), not on the position of the cell in the sweep, so that every
+    replicate is reproducible however the cells are scheduled. Cells that
+    only differ in the other parameters share the same streams. With seed =
+    None, fresh entropy is drawn from the operating system.
+    """
+
+    p0Bits = int(np.float64(p0).view(np.uint64))
+    return np.random.SeedSequence(seed, spawn_key=(int(nE), int(nN), p0Bits,
+    int(rep)))
+
+def getRandom(seed, nE, nN, p0, rep=0):
+    """
+    Return a random.Random instance seeded from getSeedSequence, for the
+    engines drawing from the random module.
+    """
+
+    ss = getSeedSequence(seed, nE, nN, p0, rep)
+    return random.Random(int.from_bytes(ss.generate_state(4).tobytes(),
+    "little"))
+
+def simBatch(nE, nN, p0, params, recorders, replicates=1, seed=None,
+firstRep=0, window=2, profiler=NULL_PROFILER):
+    """
+    Simulate replicates firstRep, ..., firstRep+replicates-1 of the cell (nE,
+    nN, p0) of the sweep, one Entrepreneur object per player, and report each
+    period to the recorders (see recorders.Recorder). The replicates advance
+    together period by period, each one drawing from its own stream (see
+    getRandom) in the same order as if it was simulated alone. Only the last
+    window generations of each replicate are kept in memory (see History).
+    The time spent in each phase of the period goes to the profiler (see
+    profiler.py).
+    """
+
+    alpha, nPeriods, deltaE_base, deltaN_base, pThreshold, pNewE, pNewI = params
+    deltaE, deltaN = getDeltas(p0, pThreshold, deltaE_base, deltaN_base)
+    correction = getCorrection(deltaE, deltaN, nPeriods)
+
+    #  s0 = deltaE*p0
+    s0 = min(deltaE, deltaN)*p0
+
+    rngs = [getRandom(seed, nE, nN, p0, r) for r in range(firstRep,
+    firstRep+replicates)]
+    needsAvgP = any(rec.needsAvgP for rec in recorders)
+    notify(recorders, "start", nE, nN, p0, s0, nPeriods, replicates)
+
+    profiler.phase("init")
+    popT = [] #  for each replicate, populations of the last periods
+    for rng in rngs:
+        pop = Population() #  population of the current period
+        # step 0 : Generate initial population
+        for i in range(nE):
+            entr = Entrepreneur(1, deltaE, varE, varSE, p0, s0, rng)
+            entr.makeDecision(entr.s)
+            if entr.decision == 1:
+                pop.append(entr)
+
+        for i in range(nN):
+            entr = Entrepreneur(0, deltaN, varN, varSN, p0, s0, rng)
+            entr.makeDecision(entr.s)
+            entr.decision = 0
+            if entr.decision == 1:
+                pop.append(entr)
+
+        popT.append(History(window))
+        popT[-1].append(pop)
+
+    profiler.phase("stats")
+    notify(recorders, "initial", *getStats([pT[0] for pT in popT], needsAvgP))
+
+    # cycle over all the periods
+    for t in range(nPeriods):
+
+        profiler.phase("shock")
+        pops = [step(pT[t], p0, rng) for pT, rng in zip(popT, rngs)]
+        profiler.phase("stats")
+        notify(recorders, "shock", t, *getStats(pops, needsAvgP))
+
+        # update experience (deltaN tends to deltaE) and beliefs
+        bayes = np.zeros((replicates, 2))
+        for r, pop in enumerate(pops):
+            profiler.phase("experience")
+            pop.updateExperience(correction)
+            profiler.phase("bayes")
+            bayes[r] = getBayes(t, popT[r], pop, 0, nN), \
+            getBayes(t, popT[r], pop, 1, nE)
+        profiler.phase("stats")
+        notify(recorders, "bayes", t, bayes)
+
+        for r, pop in enumerate(pops):
+            rng = rngs[r]
+            profiler.phase("belief")
+            pop.updateBelief(alpha, bayes[r].tolist())
+
+            # each individual persists depending on the updated beliefs
+            profiler.phase("decision")
+            popAux = Population()
+            for i in range(len(pop)):
+                pop[i].makeDecision(pop[i].s)
+                if pop[i].decision == 1:
+                    popAux.append(pop[i])
+
+            # add new entrants at the end of the period(beginning of
+            # previous period)
+            profiler.phase("entrants")
+            if t < nPeriods-1:
+                newE = int(pNewE*getTotal(pop,1))
+                avgP_E = getAvgP(popAux,1)
+                for i in range(newE):
+                    entr = Entrepreneur(1, 1.0, varE, varSE, avgP_E, s0, rng)
                     entr.makeDecision(entr.s)
                     if entr.decision == 1:
-                        pop.append(entr)
+                        popAux.append(entr)
+
+                newN = int(pNewI*getTotal(pop,0))
+                avgP_N = getAvgP(popAux,0)
+                if t > 0:
+                    for i in range(newN):
+                        entr = Entrepreneur(0, 1.0, varN, varSN, avgP_N, s0,
+                        rng)
+                        entr.makeDecision(entr.s)
+                        if entr.decision == 1:
+                            popAux.append(entr)
+
 
+            # first, let us add the inexperienced if it is first period
+            if t == 0:
                 for i in range(nN):
-                    entr = Entrepreneur(0, deltaN, varN, varSN, p0, s0)
+                    entr = Entrepreneur(0, deltaN, varN, varSN, p0, s0, rng)
                     entr.makeDecision(entr.s)
-                    entr.decision = 0
                     if entr.decision == 1:
-                        pop.append(entr)
-
-                popT.append(pop)
-                #  printStats(popT[0], 0, nE, nN)
-
-                frow.append(getTotal(pop,1))
-                frow.append(getTotal(pop,0))
-                frow.append(getAvgP(pop,1))
-                frow.append(getAvgP(pop,0))
-
-
-                # cycle over all the periods
-                for t in range(nPeriods):
-
-                    pop = step(popT[t], p0)
-
-
-                    #  printStats(pop, t+1, nE, nN)
-
-                    frow.append(getTotal(pop,1))
-                    frow.append(getTotal(pop,0))
-                    frow.append(getAvgP(pop,1))
-                    frow.append(getAvgP(pop,0))
-
-                    # update experience: deltaN tends to deltaE
-                    if deltaE < deltaN:
-                        correction = 1.0/(1.0+gamma)
-                    else:
-                        correction = 1.0+gamma
-
-                    for i in range(len(pop)):
-                        if pop[i].experience == 0:
-                            pop[i].updateExperience(correction)
-
-                    # update beliefs
-                    bayesE = getBayes(t, popT, pop, 1, nE)
-                    bayesN = getBayes(t, popT, pop, 0, nN)
-                    #  print("Bayes Beliefs :: E = {0:5.2f}, N = {1:5.2f}".format(bayesE,
-                    #  bayesN))
-                    frow.append(bayesE)
-                    frow.append(bayesN)
-                    for i in range(len(pop)):
-                        if pop[i].experience == 1:
-                            pBayes = bayesE
-                        else:
-                            pBayes = bayesN
-                        pop[i].updateBelief(alpha, pBayes)
-
-                    #  print("After Bayes update beliefs we get :: ")
-                    #  printStats(pop, t+1, nE, nN)
-
-                    # each individual persists depending on the updated beliefs
-                    popAux = []
-                    for i in range(len(pop)):
-                        pop[i].makeDecision(pop[i].s)
-                        if pop[i].decision == 1:
-                            popAux.append(pop[i])
-
-                    # add new entrants at the end of the period(beginning of
-                    # previous period)
-
-
-                    if t < nPeriods-1:
-                        newE = int(pNewE*getTotal(pop,1))
-                        avgP_E = getAvgP(popAux,1)
-                        #  print("NEW ENTRANTS E :", newE)
-                        #  print("  Parameters :  p0 = {0:5.2f}, s0 = {1:5.2f}".format(avgP_E, s0))
-                        for i in range(newE):
-                            entr = Entrepreneur(1, 1.0, varE, varSE, avgP_E, s0)
-                            entr.makeDecision(entr.s)
-                            if entr.decision == 1:
-                                popAux.append(entr)
-
-                        newN = int(pNewI*getTotal(pop,0))
-                        avgP_N = getAvgP(popAux,0)
-                        #  print("NEW ENTRANTS N :", newN)
-                        #  print("  Parameters :  p0 = {0:5.2f}, s0 = {1:5.2f}".format(avgP_N, s0))
-                        if t > 0:
-                            for i in range(newN):
-                                entr = Entrepreneur(0, 1.0, varN, varSN, avgP_N, s0)
-                                entr.makeDecision(entr.s)
-                                if entr.decision == 1:
-                                    popAux.append(entr)
-
-
-                    # first, let us add the inexperienced if it is first period
-                    if t == 0:
-                        for i in range(nN):
-                            entr = Entrepreneur(0, deltaN, varN, varSN, p0, s0)
-                            entr.makeDecision(entr.s)
-                            if entr.decision == 1:
-                                popAux.append(entr)
-
-                    popT.append(popAux)
-
-                    frow.append(getTotal(popT[t+1],1))
-                    frow.append(getTotal(popT[t+1],0))
-                    frow.append(getAvgP(popT[t+1],1))
-                    frow.append(getAvgP(popT[t+1],0))
-
-                    #  input("End of period ")
-                    # update progress widget
-                    ff.value += unitProgress
-
-                # store results of this iteration
-                results.append([p0, getTotal(popT[nPeriods], 1),
-                getTotal(popT[nPeriods], 0)])
-                frow.append(getTotal(popT[nPeriods], 1))
-                frow.append(getTotal(popT[nPeriods], 0))
-                allRows.append(frow)
-                
-                dfEl.append({"nrE":frow[0], "nrI":frow[1], "p0":p0, "nE":frow[-2],
-                "nI":frow[-1]})
-
-
-        csvfile = "summary_" + str(nPeriods) + ".csv"
-        output = open(csvfile, "w")
-        writer = csv.writer(output, lineterminator='\n')
-        writer.writerows(allRows)
-
-        df = pd.DataFrame(dfEl)
-
-        return df
+                        popAux.append(entr)
 
-def runSimTime(nESet, nNSet, alpha, nPeriods, deltaE_base, deltaN_base,ff, p0L,
-p0H, pThreshold, pNewE, pNewI):
-
-    # write the headers of the csv file
-    frow= []
-    frow.append("nrE")
-    frow.append("nrI")
-    frow.append("p0")
-    frow.append("S0")
-
-    frow.append("nrE")
-    frow.append("nrI")
-    frow.append("avgp0_E")
-    frow.append("avgp0_I")
-     
-    for t in range(nPeriods):
-        frow.append("nr_E_" + str(t+1))
-        frow.append("nr_I_" + str(t+1))
-        frow.append("avgp0_E_" + str(t+1))
-        frow.append("avgp0_I_" + str(t+1))
-        
-        frow.append("bayesE_" + str(t+1))
-        frow.append("bayesI_" + str(t+1))
-
-        frow.append("nrE_" + str(t+1))
-        frow.append("nrI_" + str(t+1))
-        frow.append("avgp0_E_" + str(t+1))
-        frow.append("avgp0_I_" + str(t+1))
-     
-    frow.append("nE")
-    frow.append("nI")
-
-    allRows = []  #  this is used to write the csv file
-    allRows.append(frow)
-    dfEl = []
-    dfTime = []
+            popT[r].append(popAux)
 
-    vals = [p0L, p0H]
-    unitProgress = ff.max/(nPeriods*len(nNSet)*len(vals))
+        profiler.phase("stats")
+        tot, avgP = getStats([pT[t+1] for pT in popT], needsAvgP)
+        notify(recorders, "period", t, tot, avgP)
+
+        if isExtinct(t, nPeriods, tot):
+            tot = notifyExtinct(recorders, t+1, nPeriods, tot, needsAvgP,
+            profiler)[-1]
+            break
+    else:
+        tot = np.array([pT.totals[nPeriods] for pT in popT])
+
+    notify(recorders, "final", tot)
+    profiler.stop()
 
+def simCell(nE, nN, p0, alpha, nPeriods, deltaE_base, deltaN_base, pThreshold,
+pNewE, pNewI, seed=None, engine="object"):
+    """
+    Simulate one cell (nE, nN, p0) of the sweep. Return the corresponding row
+    of the csv file (see getHeader).
+    """
+
+    rec = RowRecorder()
+    getEngine(engine)(nE, nN, p0, Params(alpha, nPeriods, deltaE_base,
+    deltaN_base, pThreshold, pNewE, pNewI), [rec], 1, seed)
+    return toRow(rec.data[0], getHeader(nPeriods))
+
+def getEngine(engine):
+    """
+    Return the kernel simulating a batch of replicates of one cell with the
+    given engine, i.e., a function with the signature of simBatch:
+    - "object" : one Entrepreneur object per player (simBatch)
+    - "numpy"  : population stored as NumPy arrays (vecsim.simBatch)
+    - "cohort" : population stored as cohorts sharing the same updates
+                 (cohortsim.simBatch)
+    - "meanfield" : expected values, with no sampling (meanfield.simBatch)
+    - "jit"    : per-agent loops, compiled with Numba if installed
+                 (jitsim.simBatch)
+    - "super"  : weighted agents, at most supersim.MAX_AGENTS per replicate
+                 ("super:<cap>" for another cap) (supersim.simBatch)
+    """
+
+    if engine == "object":
+        return simBatch
+    elif engine == "numpy":
+        import vecsim
+        return vecsim.simBatch
+    elif engine == "cohort":
+        import cohortsim
+        return cohortsim.simBatch
+    elif engine == "meanfield":
+        import meanfield
+        return meanfield.simBatch
+    elif engine == "jit":
+        import jitsim
+        return jitsim.simBatch
+    elif engine == "super" or engine.startswith("super:"):
+        import supersim
+        if engine == "super":
+            return supersim.simBatch
+        return partial(supersim.simBatch, cap=int(float(engine[6:])))
+    else:
+        raise ValueError("Unknown engine '{0}'".format(engine))
+
+def isCount(field):
+    """
+    Return True if a field of the csv file is a number of players.
+    """
+
+    return field.startswith("nr") or field in ("nE", "nI")
+
+def toRow(values, header):
+    """
+    Convert an array of values into a row of the csv file, numbers of players
+    being stored as integers (unless they are expected values, see
+    meanfield.py).
+    """
+
+    return [int(v) if isCount(field) and float(v).is_integer() else v for v,
+    field in zip(values, header)]
+
+def summarizeReplicates(rows, level=0.95, axis=0):
+    """
+    Return, for each field, the mean over the replicates of a cell (along
+    the given axis), its standard deviation and the bounds of the confidence
+    interval of the mean at the given level (normal approximation). Averages
+    of empty groups (nan) are ignored.
+    """
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(rows, axis=axis)
+        std = np.nanstd(rows, axis=axis, ddof=1)
+    z = NormalDist().inv_cdf(0.5 + level/2.0)
+    halfWidth = z*std/np.sqrt(np.sum(~np.isnan(rows), axis=axis))
+
+    return mean, std, mean - halfWidth, mean + halfWidth
+
+def getReplicateHeader(nPeriods):
+    """
+    Return the header of the csv file when each cell is replicated: the mean
+    of each field, followed by the dispersion of the final counts.
+    """
+
+    return getHeader(nPeriods) + ["nE_std", "nI_std", "nE_lo", "nE_hi",
+    "nI_lo", "nI_hi"]
+
+def getSweepHeader(nPeriods, replicates, sequential=False,
+checkpoints=False):
+    """
+    Return the header of the csv file of a sweep (see writeSweep).
+    """
+
+    if replicates == 1:
+        header = getHeader(nPeriods)
+    else:
+        header = getReplicateHeader(nPeriods)
+    if sequential:
+        header = header + ["replicates"]
+    if checkpoints:
+        header = header + ["horizon"]
+    return header
+
+def getCellSummary(rows, header, level=0.95):
+    """
+    Return the row of the csv file of a cell, given the rows of its
+    replicates: the row itself for a single replicate, the means and the
+    dispersion of the final counts otherwise (see getReplicateHeader).
+    """
+
+    if len(rows) == 1:
+        return toRow(rows[0], header)
+
+    mean, std, lo, hi = summarizeReplicates(rows, level)
+    frow = toRow(rows[0, :4], header) + list(mean[4:])
+    frow += [std[-2], std[-1], lo[-2], hi[-2], lo[-1], hi[-1]]
+
+    return frow
+
+def mergeData(datas):
+    """
+    Return the data of a recorder over several batches of replicates, given
+    its data of each batch (arrays and dicts of arrays indexed by replicate
+    are concatenated, numbers are summed).
+    """
+
+    if isinstance(datas[0], dict):
+        return {key: np.concatenate([data[key] for data in datas]) for key in
+        datas[0]}
+    if isinstance(datas[0], np.ndarray):
+        return np.concatenate(datas)
+    return sum(datas)
+
+def runBatches(run, recorderTypes, replicates, precision):
+    """
+    Run the replicates of a cell batch by batch, until the confidence
+    interval of the mean of both final counts is narrow enough or all the
+    replicates are run (see Precision). run(recorders, replicates, firstRep)
+    simulates a batch. Return the data of one recorder of each type over the
+    replicates run, and the number of agents simulated.
+    """
+
+    batches = []
+    final = []
+    agents = 0
+    done = 0
+    while done < replicates:
+        size = min(precision.batch, replicates - done)
+        recorders = [recorderType() for recorderType in recorderTypes]
+        last = FinalRecorder()
+        work = WorkRecorder()
+        run(recorders + [last, work], size, done)
+        batches.append([rec.data for rec in recorders])
+        final.append(last.data)
+        agents += work.data
+        done += size
+
+        if done > 1:
+            mean, std, lo, hi = summarizeReplicates(np.concatenate(final),
+            precision.level)
+            if np.all(hi - lo <= precision.width):
+                break
+
+    return [mergeData(datas) for datas in zip(*batches)], agents
+
+
+def runCell(cell, checkpoints=None, profile=False):
+    """
+    Simulate all the replicates of one cell of a sweep. The cell is the tuple
+    (engine, nE, nN, p0, params, replicates, seed, recorderTypes, precision),
+    so that it can be sent to a worker process as is; if precision (see
+    Precision) is given, replicates is the largest number of replicates and
+    the cell stops as soon as its final counts are precise enough (see
+    runBatches). Return the data of one recorder of each type, along with a
+    dict holding the number of agents simulated (see recorders.WorkRecorder),
+    the horizon of the correction with checkpoints and, if profile is set,
+    the time and memory spent in each phase of the period (see profiler.py).
+
+    If checkpoints (a directory) is given, the cell is run with the numpy
+    engine and its final state is stored there: the next run of the same
+    cell with more periods extends it rather than starting from t = 0 (see
+    checkpoint.py).
+    """
+
+    engine, nE, nN, p0, params, replicates, seed, recorderTypes, precision = \
+    cell
+    recorders = [recorderType() for recorderType in recorderTypes]
+    work = WorkRecorder()
+    profiler = getProfiler(profile)
+    info = {"agents": 0, "profile": None, "horizon": None}
+    if checkpoints is None and precision is not None:
+        simulate = getEngine(engine)
+        def run(recorders, replicates, firstRep):
+            simulate(nE, nN, p0, params, recorders, replicates, seed,
+            firstRep=firstRep, profiler=profiler)
+        datas, info["agents"] = runBatches(run, recorderTypes, replicates,
+        precision)
+        info["profile"] = getattr(profiler, "data", None)
+        return datas, info
+
+    if checkpoints is None:
+        getEngine(engine)(nE, nN, p0, params, recorders + [work], replicates,
+        seed, profiler=profiler)
+        info["agents"] = work.data
+        info["profile"] = getattr(profiler, "data", None)
+        return [rec.data for rec in recorders], info
+
+    if engine != "numpy":
+        raise ValueError("Checkpoints need the numpy engine")
+    if precision is not None:
+        raise ValueError("Checkpoints need a fixed number of replicates")
+    import vecsim
+    from checkpoint import getFile, loadCheckpoint
+
+    file = getFile(checkpoints, cell)
+    state = None
+    if os.path.exists(file):
+        state = loadCheckpoint(file)
+        if not state.matches(nE, nN, p0, params, replicates, 0, seed):
+            state = None
+    state = vecsim.simBatch(nE, nN, p0, params, recorders + [work],
+    replicates, seed, state=state, keepState=True, profiler=profiler)
+    state.save(file)
+    info["horizon"] = state.horizon
+    info["agents"] = work.data
+    info["profile"] = getattr(profiler, "data", None)
+    return [rec.data for rec in recorders], info
+
+def sweep(cells, workers=1, checkpoints=None, profile=False, run=None):
+    """
+    Simulate the cells of a sweep (see runCell) and yield their data and
+    info in the same order as cells. With workers > 1 the cells are spread
+    over a pool of worker processes (workers=None uses all the cores). run
+    (a function of the module level) simulates a cell in place of runCell.
+    """
+
+    if checkpoints is not None:
+        os.makedirs(checkpoints, exist_ok=True)
+    if run is None:
+        run = partial(runCell, checkpoints=checkpoints, profile=profile)
+    if workers == 1:
+        for cell in cells:
+            yield run(cell)
+    else:
+        if workers is None:
+            workers = os.cpu_count()
+        from concurrent.futures import ProcessPoolExecutor
+        chunksize = max(1, len(cells)//(4*workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            try:
+                for result in pool.map(run, cells, chunksize=chunksize):
+                    yield result
+            finally:
+                # stopped early (see runSweep): drop the cells not started
+                pool.shutdown(cancel_futures=True)
+
+def runSweep(nESet, nNSet, vals, params, recorderTypes=(RowRecorder,),
+engine="object", replicates=1, seed=None, workers=1, progress=None,
+cache=None, checkpoints=None, profiles=None, cancel=None, precision=None,
+horizons=None):
+    """
+    Simulate every cell (nE, nN, p0) of nESet x nNSet x vals and yield, cell
+    by cell in this order, the tuple (nE, nN, p0, data), data holding what
+    one recorder of each of the recorderTypes recorded (see recorders.py).
+    If precision is given, each cell runs at most replicates replicates (see
+    runCell).
+    If given, progress is told as each cell is done (see progress.py), and
+    only the cells missing from the cache (see cache.CellCache) are
+    simulated.
+    Cells extended from a checkpoint (see runCell) are not cached, since
+    they keep the correction of the run they extend. If profiles is a list,
+    the phases of each cell simulated are profiled and one row per phase
+    is appended to it (see profiler.py). If horizons is a list, the horizon
+    of each cell (see runCell) is appended to it before the cell is
+    yielded. If cancel (e.g. a threading.Event) is set, the sweep stops
+    before the next cell.
+    """
+
+    cells = []
     for nE in nESet:
 
         for nN in nNSet:
-            results = [] # keep track of the percentage of persistent
 
             for p0 in vals:  #  for every value of the objective probability p0
-                if p0 <= pThreshold: #  rare event
-                    deltaE = deltaE_base
-                    deltaN = deltaN_base
-                else:
-                    deltaE = deltaN_base
-                    deltaN = deltaE_base
-
-                gamma = abs(deltaE-deltaN)/nPeriods
-
-                frow = []
-
-                #  s0 = deltaE*p0
-                s0 = min(deltaE, deltaN)*p0
-
-                # frow is used to store information of a row of the csv file
-                frow.append(nE)
-                frow.append(nN)
-                frow.append(p0)
-                frow.append(s0)
-
-                popT = [] #  total polation (over all the periods)
-                pop = [] #  population of the current period
-                # step 0 : Generate initial population
-                for i in range(nE):
-                    entr = Entrepreneur(1, deltaE, varE, varSE, p0, s0)
-                    entr.makeDecision(entr.s)
-                    if entr.decision == 1:
-                        pop.append(entr)
+                cells.append((engine, nE, nN, p0, params, replicates, seed,
+                recorderTypes, precision))
+
+    if checkpoints is not None:
+        cache = None
+    cached = [None]*len(cells)
+    if cache is not None:
+        cached = [cache.get(cell) for cell in cells]
+    missing = [cell for cell, data in zip(cells, cached) if data is None]
+    simulated = sweep(missing, workers, checkpoints, profiles is not None)
+
+    progress = getProgress(progress)
+    if progress is not None:
+        progress.start(len(cells))
+
+    # cells are independent: data come back in the order of cells
+    for cell, data in zip(cells, cached):
+        if cancel is not None and cancel.is_set():
+            break
+        agents = 0
+        horizon = None
+        if data is None:
+            data, info = next(simulated)
+            horizon = info["horizon"]
+            if cache is not None:
+                cache.put(cell, data)
+            agents = info["agents"]
+            if profiles is not None:
+                for phase, (seconds, calls, peak) in info["profile"].items():
+                    profiles.append({"nrE": cell[1], "nrI": cell[2],
+                    "p0": cell[3], "phase": phase, "seconds": seconds,
+                    "calls": calls, "peakKB": peak/1024})
+        if horizons is not None:
+            horizons.append(horizon)
+        yield cell[1], cell[2], cell[3], data
+
+        if progress is not None:
+            progress.update(1, agents)
+
+    simulated.close()
+    if progress is not None:
+        progress.close()
+
+
+def getThresholds(vals, params):
+    """
+    Return the threshold S0 of each value of p0 of a sweep.
+    """
 
-                for i in range(nN):
-                    entr = Entrepreneur(0, deltaN, varN, varSN, p0, s0)
-                    entr.makeDecision(entr.s)
-                    entr.decision = 0
-                    if entr.decision == 1:
-                        pop.append(entr)
-
-                popT.append(pop)
-                #  printStats(popT[0], 0, nE, nN)
-
-                frow.append(getTotal(pop,1))
-                frow.append(getTotal(pop,0))
-                frow.append(getAvgP(pop,1))
-                frow.append(getAvgP(pop,0))
-
-
-                # cycle over all the periods
-                for t in range(nPeriods):
-
-                    pop = step(popT[t], p0)
-
-
-                    #  printStats(pop, t+1, nE, nN)
-
-                    frow.append(getTotal(pop,1))
-                    frow.append(getTotal(pop,0))
-                    frow.append(getAvgP(pop,1))
-                    frow.append(getAvgP(pop,0))
-
-                    # update experience: deltaN tends to deltaE
-                    if deltaE < deltaN:
-                        correction = 1.0/(1.0+gamma)
-                    else:
-                        correction = 1.0+gamma
-
-                    for i in range(len(pop)):
-                        if pop[i].experience == 0:
-                            pop[i].updateExperience(correction)
-
-                    # update beliefs
-                    bayesE = getBayes(t, popT, pop, 1, nE)
-                    bayesN = getBayes(t, popT, pop, 0, nN)
-                    #  print("Bayes Beliefs :: E = {0:5.2f}, N = {1:5.2f}".format(bayesE,
-                    #  bayesN))
-                    frow.append(bayesE)
-                    frow.append(bayesN)
-                    for i in range(len(pop)):
-                        if pop[i].experience == 1:
-                            pBayes = bayesE
-                        else:
-                            pBayes = bayesN
-                        pop[i].updateBelief(alpha, pBayes)
-
-                    #  print("After Bayes update beliefs we get :: ")
-                    #  printStats(pop, t+1, nE, nN)
-
-                    # each individual persists depending on the updated beliefs
-                    popAux = []
-                    for i in range(len(pop)):
-                        pop[i].makeDecision(pop[i].s)
-                        if pop[i].decision == 1:
-                            popAux.append(pop[i])
-
-                    # add new entrants at the end of the period(beginning of
-                    # previous period)
-
-
-                    if t < nPeriods-1:
-                        newE = int(pNewE*getTotal(pop,1))
-                        avgP_E = getAvgP(popAux,1)
-                        #  print("NEW ENTRANTS E :", newE)
-                        #  print("  Parameters :  p0 = {0:5.2f}, s0 = {1:5.2f}".format(avgP_E, s0))
-                        for i in range(newE):
-                            entr = Entrepreneur(1, 1.0, varE, varSE, avgP_E, s0)
-                            entr.makeDecision(entr.s)
-                            if entr.decision == 1:
-                                popAux.append(entr)
-
-                        newN = int(pNewI*getTotal(pop,0))
-                        avgP_N = getAvgP(popAux,0)
-                        #  print("NEW ENTRANTS N :", newN)
-                        #  print("  Parameters :  p0 = {0:5.2f}, s0 = {1:5.2f}".format(avgP_N, s0))
-                        if t > 0:
-                            for i in range(newN):
-                                entr = Entrepreneur(0, 1.0, varN, varSN, avgP_N, s0)
-                                entr.makeDecision(entr.s)
-                                if entr.decision == 1:
-                                    popAux.append(entr)
-
-
-                    # first, let us add the inexperienced if it is first period
-                    if t == 0:
-                        for i in range(nN):
-                            entr = Entrepreneur(0, deltaN, varN, varSN, p0, s0)
-                            entr.makeDecision(entr.s)
-                            if entr.decision == 1:
-                                popAux.append(entr)
-
-                    popT.append(popAux)
-
-                    frow.append(getTotal(popT[t+1],1))
-                    frow.append(getTotal(popT[t+1],0))
-                    frow.append(getAvgP(popT[t+1],1))
-                    frow.append(getAvgP(popT[t+1],0))
-
-                    #  input("End of period ")
-                    # update progress widget
-                    ff.value += unitProgress
-
-                # store results of this iteration
-                results.append([p0, getTotal(popT[nPeriods], 1),
-                getTotal(popT[nPeriods], 0)])
-                frow.append(getTotal(popT[nPeriods], 1))
-                frow.append(getTotal(popT[nPeriods], 0))
-                allRows.append(frow)
-                
-                dfEl.append({"nrE":frow[0], "nrI":frow[1], "p0":p0, "nE":frow[-2],
-                "nI":frow[-1]})
-
-                pos = 4
-                stepsize = 10
-                for tt in range(nPeriods+1):
-                    dfTime.append({"p0": p0, "nrE": frow[0], "nrI": frow[1],
-                    "t": tt, "nE": frow[pos], "nI": frow[pos+1]})
-                    pos += stepsize
-
-        csvfile = "summary_" + str(nPeriods) + ".csv"
-        output = open(csvfile, "w")
-        writer = csv.writer(output, lineterminator='\n')
-        writer.writerows(allRows)
-
-        df = pd.DataFrame(dfEl)
-        dfT= pd.DataFrame(dfTime)
-
-        return dfT
+    return [min(getDeltas(p0, params.pThreshold, params.deltaE_base,
+    params.deltaN_base))*p0 for p0 in vals]
+
+def runCube(nESet, nNSet, vals, params, engine="object", replicates=1,
+seed=None, workers=1, progress=None, cache=None, checkpoints=None,
+profiles=None, cancel=None, onCell=None, precision=None, store=None):
+    """
+    Simulate every cell (nE, nN, p0) of nESet x nNSet x vals (see runSweep)
+    and return the metrics of every period in a cube.ResultCube, kept in
+    memory or, if store (a directory) is given, in memory-mapped files
+    written cell by cell (see cube.openCube). If given, onCell(cube, index)
+    is called as soon as the cell index is stored. With precision, the
+    cells stopped early leave the replicates not run nan.
+    """
+
+    if precision is not None and replicates < 2:
+        raise ValueError("Precision needs at least 2 replicates")
+    cube = ResultCube(nESet, nNSet, vals, replicates, params.nPeriods,
+    getThresholds(vals, params), sequential=precision is not None,
+    path=store, checkpoints=checkpoints is not None)
+
+    horizons = []
+    for n, (nE, nN, p0, (block,)) in enumerate(runSweep(nESet, nNSet, vals,
+    params, (CubeRecorder,), engine, replicates, seed, workers, progress,
+    cache, checkpoints, profiles, cancel, precision, horizons)):
+        index = cube.getIndex(n)
+        cube.store(index, block, horizons[n])
+        if onCell is not None:
+            onCell(cube, index)
+
+    cube.flush()
+    return cube
+
+def getCountTable(cube, level=0.95, time=False, index=None):
+    """
+    Return the table of the number of players of the cells done (or of the
+    cells index only, e.g. (i, j, k) or (slice(None), j)): nrE, nrI, p0,
+    nE, nI at the end of the run or, if time is True, p0, nrE, nrI, t, nE,
+    nI at the end of every period, t = 0 included. Replicated cells have the
+    mean of nE and nI, along with their standard deviation and confidence
+    interval (nE_std, nE_lo, nE_hi, ...) and, if the cells stop on
+    precision, the number of replicates run. With checkpoints, horizon is
+    the number of periods of the correction (less than nPeriods if the cell
+    extends a shorter run, see checkpoint.py).
+    """
+
+    periods = cube.coords["period"]
+    tot = cube.data[..., 6:8] #  players (E, I) of each period
+    if not time:
+        periods = periods[-1:]
+        tot = tot[..., -1:, :]
+
+    done = np.array(cube.done)
+    if index is not None:
+        done = np.zeros(cube.done.shape, dtype=bool)
+        done[index] = cube.done[index]
+    nE, nN, p0 = [grid[done] for grid in np.meshgrid(cube.coords["nE"],
+    cube.coords["nN"], cube.coords["p0"], indexing="ij")]
+    tot = tot[done] #  (cells, replicate, period, group)
+    nPer = len(periods)
+
+    columns = {"nrE": np.repeat(nE, nPer), "nrI": np.repeat(nN, nPer),
+    "p0": np.repeat(p0, nPer)}
+    if time:
+        columns = {"p0": columns["p0"], "nrE": columns["nrE"], "nrI":
+        columns["nrI"], "t": np.tile(periods, len(nE))}
+
+    if tot.shape[1] == 1:
+        counts = tot[:, 0].reshape(-1, 2)
+        if np.all(counts == np.round(counts)):
+            counts = counts.astype(np.int64)
+        columns.update({"nE": counts[:, 0], "nI": counts[:, 1]})
+    else:
+        mean, std, lo, hi = [values.reshape(-1, 2) for values in
+        summarizeReplicates(tot, level, axis=1)]
+        columns.update({"nE": mean[:, 0], "nI": mean[:, 1],
+        "nE_std": std[:, 0], "nI_std": std[:, 1], "nE_lo": lo[:, 0],
+        "nE_hi": hi[:, 0], "nI_lo": lo[:, 1], "nI_hi": hi[:, 1]})
+        if cube.sequential:
+            columns["replicates"] = np.repeat(cube.used[done], nPer)
+    if cube.checkpoints:
+        columns["horizon"] = np.repeat(cube.horizon[done], nPer)
+
+    return Table(columns)
+
+def writeSweep(nESet, nNSet, vals, params, output, format, level, time,
+onCell, **kwargs):
+    """
+    Run a sweep (see runCube) and write the row of each cell to output as
+    soon as it is done; onCell gets the rows of the table of the cell (see
+    getCountTable). vals is the list of values of p0, or an
+    adaptive.AdaptiveGrid giving them round by round. Return the cubes of
+    the sweep (one per round). With precision, the rows end with the number
+    of replicates run and, with checkpoints, with the horizon of the cell.
+    """
 
+    # the csv file is written cell by cell, as the sweep goes
+    sequential = kwargs.get("precision") is not None
+    checkpoints = kwargs.get("checkpoints") is not None
+    header = getSweepHeader(params.nPeriods, kwargs.get("replicates", 1),
+    sequential, checkpoints)
+    if output is None:
+        output = "summary_" + str(params.nPeriods) + ".csv"
+
+    with ResultWriter(output, header, format) as writer:
+        def writeCell(cube, index):
+            rows = cube.getRows(*index)
+            row = getCellSummary(rows, header, level)
+            if sequential:
+                row.append(len(rows))
+            if checkpoints:
+                row.append(int(cube.horizon[index]))
+            writer.write(row)
+            if onCell is not None:
+                onCell(getCountTable(cube, level, time, index).toRows())
+
+        if not isinstance(vals, AdaptiveGrid):
+            return [runCube(nESet, nNSet, vals, params, onCell=writeCell,
+            **kwargs)]
+
+        if kwargs.get("store") is not None:
+            raise ValueError("A store needs a fixed grid of p0")
+        progress = getProgress(kwargs.get("progress"))
+        if progress is not None:
+            kwargs["progress"] = RoundsProgress(progress)
+
+        cubes = []
+        cancel = kwargs.get("cancel")
+        for roundVals in vals:
+            cubes.append(runCube(nESet, nNSet, roundVals, params,
+            onCell=writeCell, **kwargs))
+            if cancel is not None and cancel.is_set():
+                break
+            vals.add(getCountTable(cubes[-1], level))
+
+        if progress is not None:
+            progress.close()
+        return cubes
+
+def getGrid():
+    """
+    Return the values of p0 of runSim.
+    """
+
+    x = np.arange(0.025, 0.27, 0.025)
+    return np.sqrt(x)
+
+def getPrecision(precision, level):
+    """
+    Return the Precision of a sweep given its width (batches of 10
+    replicates) or a Precision, or None.
+    """
+
+    if precision is None or isinstance(precision, Precision):
+        return precision
+    return Precision(float(precision), 10, level)
+
+
+def runSim(nESet, nNSet, alpha, nPeriods, deltaE_base, deltaN_base,ff,
+pThreshold, pNewE, pNewI, engine="object", replicates=1, level=0.95,
+workers=1, seed=None, output=None, format=None, cache=None,
+checkpoints=None, profile=False, onCell=None, cancel=None, frame=True,
+adaptive=None, precision=None, store=None):
+
+    #  nESet = [1000]
+    #  ratioEvsN = [0.5, 0.8, 0.9, 1.0, 1.1, 1.2, 1.5]
+
+    params = Params(alpha, nPeriods, deltaE_base, deltaN_base, pThreshold,
+    pNewE, pNewI)
+    # ff: progress bar, progress object or function (see progress.py)
+    # profile: also return the time spent in each phase (see profiler.py)
+    # onCell: called with the rows of df of each cell, as soon as it is done
+    # frame: df is a pandas DataFrame, or a table.Table (NumPy only) if False
+    # cancel: stop the sweep when set, df holding the cells done so far
+    # adaptive: tolerance of an adaptive grid of p0 over the same range, or
+    # an AdaptiveGrid (see adaptive.py)
+    # precision: width of the confidence interval of nE and nI at which a
+    # cell stops, replicates being the most it runs, or a Precision
+    # store: directory of memory-mapped files keeping every period of every
+    # replicate (see cube.py), rather than the memory
+    profiles = [] if profile else None
+    precision = getPrecision(precision, level)
+
+    vals = getGrid()
+    if adaptive is not None and not isinstance(adaptive, AdaptiveGrid):
+        adaptive = AdaptiveGrid(vals[0], vals[-1], pThreshold, tol=adaptive)
+
+    cubes = writeSweep(nESet, nNSet, vals if adaptive is None else adaptive,
+    params, output, format, level, False, onCell, engine=engine,
+    replicates=replicates, seed=seed, workers=workers, progress=ff,
+    cache=cache, checkpoints=checkpoints, profiles=profiles, cancel=cancel,
+    precision=precision, store=store)
+    if adaptive is None:
+        df = getCountTable(cubes[0], level)
+    else:
+        df = concat([getCountTable(cube, level) for cube in cubes],
+        sortBy=["nrE", "nrI", "p0"])
+    if frame:
+        df = df.toFrame()
+
+    if profile:
+        return df, getFrame(profiles, frame)
+    return df
+
+def runSimTime(nESet, nNSet, alpha, nPeriods, deltaE_base, deltaN_base,ff, p0L,
+p0H, pThreshold, pNewE, pNewI, engine="object", replicates=1, level=0.95,
+workers=1, seed=None, output=None, format=None, cache=None,
+checkpoints=None, profile=False, onCell=None, cancel=None, frame=True,
+precision=None, store=None):
+
+    params = Params(alpha, nPeriods, deltaE_base, deltaN_base, pThreshold,
+    pNewE, pNewI)
+    # ff: progress bar, progress object or function (see progress.py)
+    # profile: also return the time spent in each phase (see profiler.py)
+    # onCell: called with the rows of df of each cell, as soon as it is done
+    # frame: df is a pandas DataFrame, or a table.Table (NumPy only) if False
+    # cancel: stop the sweep when set, df holding the cells done so far
+    # precision, store: see runSim
+    profiles = [] if profile else None
+    precision = getPrecision(precision, level)
+
+    vals = [p0L, p0H]
+
+    # number of players of every period: a reshape of the cube
+    cube, = writeSweep(nESet, nNSet, vals, params, output, format, level,
+    True, onCell, engine=engine, replicates=replicates, seed=seed,
+    workers=workers, progress=ff, cache=cache, checkpoints=checkpoints,
+    profiles=profiles, cancel=cancel, precision=precision, store=store)
+    dfT = getCountTable(cube, level, time=True)
+    if frame:
+        dfT = dfT.toFrame()
+
+    if profile:
+        return dfT, getFrame(profiles, frame)
+    return dfT
+
+def runSimAsync(*args, **kwargs):
+    """
+    Start runSim (same arguments) in a background thread and return its
+    handle at once (see background.SimRun).
+    """
+    from background import SimRun
+    return SimRun(runSim, *args, **kwargs)
+
+def runSimTimeAsync(*args, **kwargs):
+    """
+    Start runSimTime (same arguments) in a background thread and return its
+    handle at once (see background.SimRun).
+    """
+    from background import SimRun
+    return SimRun(runSimTime, *args, **kwargs)
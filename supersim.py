@@ -0,0 +1,64 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Super-individual engine for the Entrepreneurship survival model.
+
+ The population is stored as arrays and simulated by vecsim.simBatch, but
+ every agent carries an integer weight w and stands for w identical
+ entrepreneurs (same p and s), so that the number of agents can be kept
+ below a cap (per replicate) whatever the growth of the population:
+    - shock: each of the w entrepreneurs survives with probability p0, the
+      weight becomes Binomial(w, p0) (exactly as with w agents)
+    - experience, beliefs and decisions apply to the w entrepreneurs at once
+    - new players: when more than cap entrepreneurs enter, cap agents are
+      drawn and the entrepreneurs are split evenly among them
+    - merge: when a replicate has more than cap agents, agents of the same
+      group are merged two by two, the lightest first; the merged agent
+      keeps the (p, s) of one of the two, drawn with probability proportional
+      to their weights
+ The totals of each group are exact, and the merge keeps the weighted sums
+ (hence the averages) unbiased. With a cap larger than the population, the
+ engine simulates one agent per entrepreneur.
+
+ Select it with (cap of 10**6 agents per replicate, or a given cap):
+ > sim.runSim(..., engine="super")
+ > sim.runSim(..., engine="super:200000")
+
+"""
+
+import vecsim
+from profiler import NULL_PROFILER
+
+
+MAX_AGENTS = 10**6 #  default cap of agents per replicate
+
+
+def simBatch(nE, nN, p0, params, recorders, replicates=1, seed=None,
+firstRep=0, profiler=NULL_PROFILER, cap=MAX_AGENTS):
+    """
+    Simulate replicates firstRep, ..., firstRep+replicates-1 of the cell (nE,
+    nN, p0) of the sweep together, with at most cap agents per replicate, and
+    report each period to the recorders (see vecsim.simBatch, which runs the
+    weighted agents).
+    """
+
+    vecsim.simBatch(nE, nN, p0, params, recorders, replicates, seed, firstRep,
+    profiler=profiler, cap=cap)
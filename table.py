@@ -0,0 +1,106 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Results of a sweep as NumPy columns.
+
+ The simulation core only needs NumPy: runSim and runSimTime collect their
+ rows in a Table, and pandas is imported (by toFrame) only when a DataFrame
+ is asked for, which is the default of runSim and runSimTime.
+
+ Usage:
+ > df = sim.runSim(..., frame=False)
+ > df["nE"], df.columns, len(df)
+ > df.toFrame()
+
+"""
+
+import numpy as np
+
+
+class Table:
+    """
+    Named columns of the same length, as NumPy arrays.
+    """
+
+    def __init__(self, columns):
+        self.data = dict(columns)
+
+    @property
+    def columns(self):
+        return list(self.data)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __len__(self):
+        return len(next(iter(self.data.values()), ()))
+
+    def __repr__(self):
+        return "Table({0} rows: {1})".format(len(self), ", ".join(self.data))
+
+    def toRows(self):
+        """
+        Return the table as a list of rows (dicts).
+        """
+
+        names = self.columns
+        return [dict(zip(names, values)) for values in zip(*[self.data[name]
+        for name in names])]
+
+    def toFrame(self):
+        """
+        Return the table as a pandas DataFrame.
+        """
+
+        import pandas as pd
+        return pd.DataFrame(self.data)
+
+
+def fromRows(rows):
+    """
+    Return the table of a list of rows (dicts with the same keys).
+    """
+
+    names = list(rows[0]) if rows else []
+    return Table((name, np.array([row[name] for row in rows])) for name in
+    names)
+
+def concat(tables, sortBy=None):
+    """
+    Return the table of the rows of the tables (with the same columns),
+    sorted by the columns sortBy if given.
+    """
+
+    names = tables[0].columns
+    table = Table((name, np.concatenate([t[name] for t in tables])) for name
+    in names)
+    if sortBy is not None:
+        order = np.lexsort([table[name] for name in reversed(sortBy)])
+        table = Table((name, table[name][order]) for name in names)
+    return table
+
+def getFrame(rows, frame=True):
+    """
+    Return the rows as a pandas DataFrame, or as a Table if frame is False.
+    """
+
+    table = fromRows(rows)
+    return table.toFrame() if frame else table
@@ -0,0 +1,341 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Vectorized engine for the Entrepreneurship survival model.
+
+ The population is stored as a struct of arrays (experience, p, s) rather
+ than as a list of Entrepreneur objects, and every phase of a period (shock,
+ experience correction, Bayes update, decision, new entrants) is applied to
+ the whole population at once. The model is the same as in sim.simCell.
+
+ Replicates of a cell are simulated together in the same arrays, each player
+ carrying the index of the replicate it belongs to (see simBatch). Players
+ may also carry a weight, for the super-individual engine (see supersim).
+
+ Select it with:
+ > sim.runSim(..., engine="numpy")
+
+"""
+
+import numpy as np
+
+import sim
+from checkpoint import Checkpoint, getKey, getRngState
+from profiler import NULL_PROFILER
+from recorders import HistoryRecorder
+from sim import varE, varN, varSE, varSN
+
+
+def drawNormal(rngs, scale, n):
+    """
+    Return n[r] normal draws (mean 0, stdev scale) from the generator of each
+    replicate r, one replicate after the other.
+    """
+
+    return np.concatenate([rng.normal(0.0, scale, k) for rng, k in zip(rngs,
+    n)])
+
+def drawUniform(rngs, n):
+    """
+    Return n[r] draws in [0.0, 1.0) from the generator of each replicate r,
+    one replicate after the other.
+    """
+
+    return np.concatenate([rng.random(k) for rng, k in zip(rngs, n)])
+
+def drawBinomial(rngs, rep, n, prob):
+    """
+    Return Binomial(n[i], prob) draws for the players i, sorted by replicate
+    rep, from the generator of each replicate.
+    """
+
+    counts = np.bincount(rep, minlength=len(rngs))
+    return np.concatenate([rng.binomial(part, prob) for rng, part in
+    zip(rngs, np.split(n, np.cumsum(counts)[:-1]))])
+
+def newPlayers(rngs, experience, n, delta, var, varS, p0, s0, cap=None):
+    """
+    Generate n[r] new players of a given group for each replicate r (see
+    Entrepreneur.__init__), p0 being either a scalar or one value per
+    replicate. Return the arrays [rep, experience, p, s] of those who decide
+    to enter.
+
+    With a cap, at most cap players are drawn per replicate and the n[r]
+    entrepreneurs are split evenly among them: the weight w of each player
+    (the number of entrepreneurs it stands for) is returned as well.
+    """
+
+    k = n if cap is None else np.minimum(n, cap)
+    rep = np.repeat(np.arange(len(n)), k)
+    p0 = np.broadcast_to(p0, n.shape)[rep]
+    p = np.maximum(delta*p0 + drawNormal(rngs, var, k), 0.0)
+    s = s0 + drawNormal(rngs, varS, k)
+    players = [rep, np.full(len(rep), experience, dtype=np.int8), p, s]
+
+    if cap is not None:
+        first = np.cumsum(k) - k
+        index = np.arange(len(rep)) - first[rep]
+        base = n//np.maximum(k, 1)
+        players.append(base[rep] + (index < (n - base*k)[rep]))
+
+    enter = p > s
+    return [arr[enter] for arr in players]
+
+def getTotals(players, nReps):
+    """
+    Return the number of entrepreneurs and the sum of their individual
+    probabilities, as two arrays of shape (nReps, 2) indexed by replicate
+    and experience. Each player counts once, or w times if weighted.
+    """
+
+    rep, exp, p = players[:3]
+    key = 2*rep + exp
+    if len(players) == 4:
+        tot = np.bincount(key, minlength=2*nReps)
+        sumP = np.bincount(key, weights=p, minlength=2*nReps)
+    else:
+        w = players[4]
+        tot = np.bincount(key, weights=w, minlength=2*nReps).astype(np.int64)
+        sumP = np.bincount(key, weights=w*p, minlength=2*nReps)
+    return tot.reshape(nReps, 2), sumP.reshape(nReps, 2)
+
+def getAvgP(tot, sumP):
+    """
+    Return the average of the individual probabilities per replicate and
+    group (nan if the group is empty).
+    """
+
+    return np.divide(sumP, tot, out=np.full(sumP.shape, np.nan), where=tot > 0)
+
+def mergeBlock(rng, p, s, w, m):
+    """
+    Merge the weighted players (p, s, w) of one group two by two, the
+    lightest first, until at most m are left.
+    """
+
+    while len(w) > m:
+        order = np.argsort(w, kind="stable")
+        p, s, w = p[order], s[order], w[order]
+        k = min(len(w) - m, len(w)//2)
+
+        a, b = slice(0, 2*k, 2), slice(1, 2*k, 2)
+        keepA = rng.random(k)*(w[a] + w[b]) < w[a]
+        p = np.concatenate((np.where(keepA, p[a], p[b]), p[2*k:]))
+        s = np.concatenate((np.where(keepA, s[a], s[b]), s[2*k:]))
+        w = np.concatenate((w[a] + w[b], w[2*k:]))
+    return p, s, w
+
+def merge(rngs, players, cap):
+    """
+    Merge weighted players (sorted by replicate) so that no replicate has
+    more than cap players, each group keeping a share of the cap
+    proportional to its number of players.
+    """
+
+    counts = np.bincount(players[0], minlength=len(rngs))
+    if (counts <= cap).all():
+        return players
+
+    order = np.lexsort((players[1], players[0]))
+    rep, exp, p, s, w = [arr[order] for arr in players]
+    key = 2*rep + exp
+    bounds = np.searchsorted(key, np.arange(2*len(rngs)+1))
+
+    blocks = []
+    for r, rng in enumerate(rngs):
+        for group in (0, 1):
+            lo, hi = bounds[2*r+group], bounds[2*r+group+1]
+            if counts[r] > cap and hi > lo:
+                m = max(1, (cap*(hi-lo))//counts[r])
+                pb, sb, wb = mergeBlock(rng, p[lo:hi], s[lo:hi], w[lo:hi], m)
+            else:
+                pb, sb, wb = p[lo:hi], s[lo:hi], w[lo:hi]
+            blocks.append((np.full(len(wb), r), np.full(len(wb), group,
+            dtype=np.int8), pb, sb, wb))
+
+    return [np.concatenate(arr) for arr in zip(*blocks)]
+
+def simBatch(nE, nN, p0, params, recorders, replicates=1, seed=None,
+firstRep=0, state=None, keepState=False, profiler=NULL_PROFILER, cap=None):
+    """
+    Simulate replicates firstRep, ..., firstRep+replicates-1 of the cell (nE,
+    nN, p0) of the sweep together, and report each period to the recorders
+    (see recorders.Recorder): the players of every replicate are stored in
+    the same arrays, sorted by the index of the replicate they belong to.
+
+    Each replicate draws from its own generator (see sim.getSeedSequence), in
+    the same order as a single replicate would: replicate r of a batch gives
+    the same values as replicate r simulated alone.
+
+    With a cap, every player carries a weight w and stands for w identical
+    entrepreneurs, and players are merged so that no replicate has more than
+    cap of them (see supersim).
+
+    With keepState=True the state of the run after the decisions of the last
+    period is returned (see checkpoint.Checkpoint). Given such a state, the
+    run is extended up to params.nPeriods periods rather than simulated from
+    t = 0, the first periods being replayed to the recorders. The time spent
+    in each phase of the period goes to the profiler (see profiler.py).
+    """
+
+    alpha, nPeriods, deltaE_base, deltaN_base, pThreshold, pNewE, pNewI = params
+    deltaE, deltaN = sim.getDeltas(p0, pThreshold, deltaE_base, deltaN_base)
+    correction = sim.getCorrection(deltaE, deltaN, nPeriods)
+    s0 = min(deltaE, deltaN)*p0
+
+    horizon = nPeriods
+    if state is None:
+        rngs = [np.random.default_rng(sim.getSeedSequence(seed, nE, nN, p0,
+        r)) for r in range(firstRep, firstRep+replicates)]
+    elif state.matches(nE, nN, p0, params, replicates, firstRep, seed):
+        # the extended run keeps the correction of the first one
+        correction = state.correction
+        horizon = state.horizon
+        rngs = state.getRngs()
+    else:
+        raise ValueError("The checkpoint does not match the run, or cannot "
+        "be extended to so many periods")
+
+    if keepState:
+        history = HistoryRecorder()
+        recorders = list(recorders) + [history]
+    needsAvgP = any(rec.needsAvgP for rec in recorders)
+    sim.notify(recorders, "start", nE, nN, p0, s0, nPeriods, replicates)
+
+    def getStats(players):
+        tot, sumP = getTotals(players, replicates)
+        return tot, getAvgP(tot, sumP) if needsAvgP else None
+
+    if state is None:
+        # step 0 : generate the initial population (see sim.py)
+        profiler.phase("init")
+        players = newPlayers(rngs, 1, np.full(replicates, nE), deltaE, varE,
+        varSE, p0, s0, cap)
+
+        profiler.phase("stats")
+        tot, avgP = getStats(players)
+        totT = [tot] #  group totals over all the periods
+        sim.notify(recorders, "initial", tot, avgP)
+        t0 = 0
+    else:
+        # resume after the decisions of the last period of the checkpoint
+        totT = state.replay(recorders)
+        players = list(state.players)
+        tot = state.tot
+        t0 = state.t
+
+    # cycle over all the periods
+    for t in range(t0, nPeriods):
+
+        if state is None or t > t0:
+            players, tot = runDecisions(rngs, t, p0, alpha, correction, totT,
+            players, recorders, getStats, profiler)
+
+        if keepState and t == nPeriods-1:
+            # no draw is left in the last period but the initial I (t = 0)
+            newState = Checkpoint(getKey(nE, nN, p0, params, replicates,
+            firstRep, seed), nPeriods, correction, [getRngState(rng) for rng
+            in rngs], players, tot, history.data, horizon)
+
+        # add new entrants at the end of the period
+        profiler.phase("entrants")
+        newPlayersT = [players]
+        if t < nPeriods-1:
+            avgPAux = getAvgP(*getTotals(players, replicates))
+
+            newE = (pNewE*tot[:, 1]).astype(np.int64)
+            newPlayersT.append(newPlayers(rngs, 1, newE, 1.0, varE, varSE,
+            avgPAux[:, 1], s0, cap))
+
+            if t > 0:
+                newN = (pNewI*tot[:, 0]).astype(np.int64)
+                newPlayersT.append(newPlayers(rngs, 0, newN, 1.0, varN, varSN,
+                avgPAux[:, 0], s0, cap))
+
+        # first, let us add the inexperienced if it is first period
+        if t == 0:
+            newPlayersT.append(newPlayers(rngs, 0, np.full(replicates, nN),
+            deltaN, varN, varSN, p0, s0, cap))
+
+        players = [np.concatenate(arr) for arr in zip(*newPlayersT)]
+        if replicates > 1:
+            # keep players sorted by replicate (stable: entrants come last)
+            order = np.argsort(players[0], kind="stable")
+            players = [arr[order] for arr in players]
+
+        if cap is not None:
+            profiler.phase("merge")
+            players = merge(rngs, players, cap)
+
+        profiler.phase("stats")
+        tot, avgP = getStats(players)
+        totT.append(tot)
+        sim.notify(recorders, "period", t, tot, avgP)
+
+        if not keepState and sim.isExtinct(t, nPeriods, tot):
+            totT += sim.notifyExtinct(recorders, t+1, nPeriods, tot, needsAvgP,
+            profiler)
+            break
+
+    sim.notify(recorders, "final", totT[nPeriods])
+    profiler.stop()
+
+    if keepState:
+        return newState
+
+def runDecisions(rngs, t, p0, alpha, correction, totT, players, recorders,
+getStats, profiler=NULL_PROFILER):
+    """
+    Run the first part of period t, up to the decisions of the players
+    (shock, experience and belief updates), and return the players who
+    persist along with the totals after the shock.
+    """
+
+    # shock: each entrepreneur survives with probability p0
+    profiler.phase("shock")
+    if len(players) == 4:
+        alive = drawUniform(rngs, totT[t].sum(axis=1)) < p0
+    else:
+        players[4] = drawBinomial(rngs, players[0], players[4], p0)
+        alive = players[4] > 0
+    players = [arr[alive] for arr in players]
+
+    profiler.phase("stats")
+    tot, avgP = getStats(players)
+    sim.notify(recorders, "shock", t, tot, avgP)
+
+    # update experience: deltaN tends to deltaE
+    profiler.phase("experience")
+    rep, exp, p, s = players[:4]
+    p[exp == 0] *= correction
+
+    # update beliefs
+    profiler.phase("bayes")
+    bayes = sim.getBayesTotals(t, totT, tot)
+    sim.notify(recorders, "bayes", t, bayes)
+    profiler.phase("belief")
+    p = alpha*p + (1.0-alpha)*bayes[rep, exp]
+
+    # each individual persists depending on the updated beliefs
+    profiler.phase("decision")
+    players[2] = p
+    stay = p > s
+    return [arr[stay] for arr in players], tot
@@ -0,0 +1,245 @@
+"""
+/***************************************************************************
+ *   copyright (C) 2018 by Marco Caserta                                   *
+ *   marco dot caserta at ie dot edu                                       *
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ *   This program is distributed in the hope that it will be useful,       *
+ *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+ *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+ *   GNU General Public License for more details.                          *
+ *                                                                         *
+ *   You should have received a copy of the GNU General Public License     *
+ *   along with this program; if not, write to the                         *
+ *   Free Software Foundation, Inc.,                                       *
+ *   59 Temple Place - Suite 330, Boston, MA  02111-1307, USA.             *
+ ***************************************************************************/
+
+ Streaming writers for the rows of a sweep.
+
+ The rows are written as soon as each cell is done, by a background thread,
+ so that I/O overlaps with the simulation. Besides csv, the rows can be
+ stored in columnar binary formats:
+    - "csv"     : same layout as summary_<nPeriods>.csv
+    - "npz"     : one NumPy array per column (written when the sweep ends)
+    - "parquet" : Parquet file, one row group every batchSize rows (pyarrow)
+    - "arrow"   : Arrow IPC file, one record batch every batchSize rows
+                  (pyarrow)
+ In the columnar formats every field is stored as float64, and repeated
+ field names get a ".1", ".2", ... suffix, as pandas.read_csv does.
+
+ Usage:
+ > with ResultWriter("summary_5.parquet", header) as writer:
+ >     writer.write(frow)
+
+"""
+
+import csv
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+FORMATS = {".csv": "csv", ".npz": "npz", ".parquet": "parquet",
+".arrow": "arrow", ".feather": "arrow"}
+
+
+def getFormat(path):
+    """
+    Return the format of an output file from its extension.
+    """
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError("Unknown output format for '{0}'".format(path))
+    return FORMATS[ext]
+
+def getColumnNames(header):
+    """
+    Return unique column names for the fields of the header: the k-th repeat
+    of a name gets the suffix ".k".
+    """
+
+    seen = {}
+    names = []
+    for field in header:
+        if field in seen:
+            seen[field] += 1
+            names.append("{0}.{1}".format(field, seen[field]))
+        else:
+            seen[field] = 0
+            names.append(field)
+    return names
+
+
+class CsvSink:
+    """
+    Append rows to a csv file, header first.
+    """
+
+    def __init__(self, path, header):
+        self.output = open(path, "w")
+        self.writer = csv.writer(self.output, lineterminator='\n')
+        self.writer.writerow(header)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.output.flush()
+
+    def close(self):
+        self.output.close()
+
+
+class NpzSink:
+    """
+    Collect rows and store them column by column in a .npz file on close.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.names = getColumnNames(header)
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def close(self):
+        data = np.array(self.rows, dtype=float).reshape(-1, len(self.names))
+        np.savez(self.path, **{name: data[:, j] for j, name in
+        enumerate(self.names)})
+
+
+class ArrowSink:
+    """
+    Write rows to a Parquet or Arrow IPC file, one row group (record batch)
+    every batchSize rows.
+    """
+
+    def __init__(self, path, header, format, batchSize=1024):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is needed to write '{0}' files".format(
+            format))
+
+        self.pa = pa
+        self.names = getColumnNames(header)
+        self.schema = pa.schema([(name, pa.float64()) for name in self.names])
+        self.batchSize = batchSize
+        self.rows = []
+        if format == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            import pyarrow.ipc as ipc
+            self.writer = ipc.new_file(path, self.schema)
+
+    def flush(self):
+        if len(self.rows) == 0:
+            return
+        data = np.array(self.rows, dtype=float).reshape(-1, len(self.names))
+        self.writer.write_table(self.pa.Table.from_arrays([data[:, j] for j
+        in range(len(self.names))], schema=self.schema))
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.batchSize:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def openSink(path, header, format=None):
+    """
+    Return the sink writing rows to path in the given format (inferred from
+    the extension if None).
+    """
+
+    if format is None:
+        format = getFormat(path)
+    if format == "csv":
+        return CsvSink(path, header)
+    elif format == "npz":
+        return NpzSink(path, header)
+    elif format in ("parquet", "arrow"):
+        return ArrowSink(path, header, format)
+    else:
+        raise ValueError("Unknown output format '{0}'".format(format))
+
+
+class ResultWriter:
+    """
+    Write rows to a file on a background thread. write() only queues the row
+    (blocking if more than maxQueue rows are waiting); errors of the writing
+    thread are raised by the next write() or by close().
+    """
+
+    def __init__(self, path, header, format=None, maxQueue=10000):
+        self.sink = openSink(path, header, format)
+        self.queue = queue.Queue(maxQueue)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """
+        Body of the writing thread: drain the queue in batches until close()
+        queues None.
+        """
+        done = False
+        try:
+            while not done:
+                rows = [self.queue.get()]
+                while True:
+                    try:
+                        rows.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if rows[-1] is None:
+                    rows.pop()
+                    done = True
+                if self.error is None:
+                    try:
+                        self.sink.write(rows)
+                    except Exception as e:
+                        self.error = e
+        finally:
+            # the file is closed even after an error, the first one is kept
+            try:
+                self.sink.close()
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+
+    def write(self, row):
+        """
+        Queue a row for writing.
+        """
+        if self.error is not None:
+            raise self.error
+        self.queue.put(row)
+
+    def close(self):
+        """
+        Write the remaining rows, close the file and wait for the thread.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        self.close()